@@ -1,5 +1,7 @@
 import argparse
+import sys
 import re
+from functools import lru_cache
 
 DEBUG = False
 
@@ -13,11 +15,13 @@ if DEBUG:
     print(args.filename)
 
 
-def convert_a_instruction(value: str) -> str:
-    number_value = int(value[1:])
-    binary_instruction = '{0:016b}'.format(number_value)
+# A-instructions are 0 followed by a 15 bit address, cached since the
+# same addresses (R0-R15, SP, loop variables) repeat throughout a program
+@lru_cache(maxsize=None)
+def convert_a_instruction(value: int) -> str:
+    binary_instruction = f"0{value:015b}"
     if DEBUG:
-        print(f'A-instr converting {value} to {binary_instruction}')
+        print(f'A-instr converting @{value} to {binary_instruction}')
     return binary_instruction
 
 # C-instruction lookup tables
@@ -75,32 +79,26 @@ jump_lookup = {
     "JMP": "111"
 }
 
-def get_a_bit(value:str) -> str:
-    if "M" in value:
-        if DEBUG:
-            print(f"a bit for {value} is 1")
-        return 1
-    else:
-        if DEBUG:
-            print(f"a bit for {value} is 0")
-        return 0
+# comps that read from M set the a bit
+m_comps = frozenset(comp for comp in comp_lookup if "M" in comp)
 
 # example: "M=A-1;JTE"
+# programs reuse a small set of C-instructions, so cache the full translation
+@lru_cache(maxsize=None)
 def convert_c_instruction(value: str)-> str:
-    if "=" not in value:
-        value = f"null={value.split(';')[0]};{value.split(';')[1]}"
-    if ";" not in value:
-        value += ";null"
-    if DEBUG:
-        print(f"cleaned value to {value}")
-    m = re.match(r'(.*)=(.*);(.*)', value)
-    dest = dest_lookup[m.group(1)]
-    comp = comp_lookup[m.group(2)]
-    a_bit = get_a_bit(m.group(2))
-    jump = jump_lookup[m.group(3)]
+    # dest=comp;jump, where dest and jump are optional
+    eq_index = value.find("=")
+    semi_index = value.find(";")
+    dest_mnemonic = value[:eq_index] if eq_index != -1 else "null"
+    comp_mnemonic = value[eq_index + 1:semi_index] if semi_index != -1 else value[eq_index + 1:]
+    jump_mnemonic = value[semi_index + 1:] if semi_index != -1 else "null"
+    dest = dest_lookup[dest_mnemonic]
+    comp = comp_lookup[comp_mnemonic]
+    a_bit = "1" if comp_mnemonic in m_comps else "0"
+    jump = jump_lookup[jump_mnemonic]
     binary_instruction = f"111{a_bit}{comp}{dest}{jump}"
     if DEBUG:
-        print(m)
+        print(f"dest:{dest_mnemonic}, comp:{comp_mnemonic}, jump:{jump_mnemonic}")
         print(f"comp:{comp}, dest:{dest}, jump:{jump}, a_bit:{a_bit}")
         print(f'C-instr converting {value} to {binary_instruction}')
     return binary_instruction
@@ -110,152 +108,97 @@ def detect_c_instruction(value: str)-> bool:
         return True
     return False
 
-def clean_data(data):
+symbol_table = {
+    "R0":0,
+    "R1":1,
+    "R2":2,
+    "R3":3,
+    "R4":4,
+    "R5":5,
+    "R6":6,
+    "R7":7,
+    "R8":8,
+    "R9":9,
+    "R10":10,
+    "R11":11,
+    "R12":12,
+    "R13":13,
+    "R14":14,
+    "R15":15,
+    "SCREEN":16384,
+    "KBD":24576,
+    "SP":0,
+    "LCL":1,
+    "ARG":2,
+    "THIS":3,
+    "THAT":4
+}
+
+# comment to end of line, stripped from the whole file at once
+comment_pattern = re.compile(r"//[^\n]*")
+
+# first pass: clean lines, record label symbols, keep only real instructions
+def first_pass(data, symbol_table):
     output = []
-    for line in data:
-        lstripped = line.lstrip()
-        # remove empty lines
-        if lstripped == "":
-            continue
-        # remove lines that start with comment
-        if lstripped[0:2] == "//":
+    # strip each line once, in C, before looking at it
+    for line_trimmed in map(str.strip, data):
+        # remove empty lines, including those that only held a comment
+        if not line_trimmed:
             continue
-        # remove comments at end of line
-        if "//" in lstripped:
-            lstripped = lstripped.split('//')[0]
 
-        # strip newlines
-        line_trimmed = lstripped.rstrip()
+        # labels point at the next real instruction
+        if line_trimmed.startswith("(") and line_trimmed.endswith(")"):
+            symbol = line_trimmed[1:-1]
+            if DEBUG:
+                print(f"found label symbol: {symbol}, adding line:{len(output)}")
+            symbol_table[symbol] = len(output)
+            continue
         output.append(line_trimmed)
     return output
 
-
-def translate_to_binary(data):
+# second pass: resolve symbols, allocate variables and translate to binary
+def second_pass(data, symbol_table):
+    # variables are allocated sequentially from RAM[16]
+    next_addr = 16
     output = []
+    # bind the per-line calls to locals to skip global/attribute lookups
+    append = output.append
+    to_a_binary = convert_a_instruction
+    to_c_binary = convert_c_instruction
     for line in data:
         # detect if A-instruction
-        if line[0:1] == "@":
-            instr = convert_a_instruction(line)
-            output.append(instr)
+        if line[0] == "@":
+            symbol = line[1:]
+            # symbols can't start with a digit, so a leading digit is a constant
+            if symbol and symbol[0].isdigit():
+                address = int(symbol)
+            else:
+                address = symbol_table.get(symbol)
+                if address is None:
+                    # variables live between RAM[16] and the screen map
+                    if next_addr >= symbol_table["SCREEN"]:
+                        raise Exception(f"No free memory left for variable {symbol}")
+                    if DEBUG:
+                        print(f"found var symbol {symbol}, using unique mem addr:{next_addr}")
+                    address = symbol_table[symbol] = next_addr
+                    next_addr += 1
+            append(to_a_binary(address))
         elif detect_c_instruction(line):
-            instr = convert_c_instruction(line)
-            output.append(instr)
+            append(to_c_binary(line))
     return output
 
 # Read in file
-reader = open(args.filename)
-input_data = []
-try:
-    # iterate over every line
-    for line in reader:
-        input_data.append(line)        
-finally:
-    reader.close()
-
-symbol_table = {
-    "R0":"0",
-    "R1":"1",
-    "R2":"2",
-    "R3":"3",
-    "R4":"4",
-    "R5":"5",
-    "R6":"6",
-    "R7":"7",
-    "R8":"8",
-    "R9":"9",
-    "R10":"10",
-    "R11":"11",
-    "R12":"12",
-    "R13":"13",
-    "R14":"14",
-    "R15":"15",
-    "SCREEN":"16384",
-    "KBD":"24576",
-    "SP":"0",
-    "LCL":"1",
-    "ARG":"2",
-    "THIS":"3",
-    "THAT":"4"
-}
-
-def first_pass(data):
-    output = []
-    for line in data:
-        if line[0] == "@" and line[1:] in symbol_table:
-            new_value = symbol_table[line[1:]]
-            if DEBUG:
-                print(f"first pass found symbol {line[1:]} -> {new_value}")
-            line = f"@{new_value}"
-        output.append(line)
-    return output
+with open(args.filename) as reader:
+    lines = comment_pattern.sub("", reader.read()).split("\n")
+instructions = first_pass(lines, symbol_table)
 
-def add_label_symbols(data, symbol_table):
-    running_line_num = 0
-    for line in data:
-        if line[0] == "(" and line[-1] == ")":
-            symbol_line_num = running_line_num
-            symbol = line.replace('(','').replace(')','')
-            if DEBUG:
-                print(f"found label symbol: {symbol}, adding line:{symbol_line_num}")
-            symbol_table[symbol] = symbol_line_num
-        else:
-            running_line_num += 1
-    return symbol_table
-
-def get_unique_mem_addr(symbol_table):
-    for i in list(range(16,16383)):
-        if i not in list(symbol_table.values()):
-            return i
-
-def add_variable_symbols(data, symbol_table):
-    running_line_num = 0
-    for line in data:
-        if line[0] == "(" and line[-1] == ")":
-            continue
-        if line[0] == "@" and line[1:] not in symbol_table and not line[1:].isnumeric():
-            unique_mem_addr = get_unique_mem_addr(symbol_table)
-            if DEBUG:
-                print(f"found var symbol {line[1:]}, using unique mem addr:{unique_mem_addr}")
-            symbol_table[line[1:]] = unique_mem_addr
-        running_line_num += 1
-    return symbol_table
-
-def replace_symbols(data, symbol_table):
-    output = []
-    for line in data:
-        # skip pseudo lines
-        if line[0] == "(" and line[-1] == ")":
-            continue
-        if line[0] == "@" and line[1:] in symbol_table:
-            if DEBUG:
-                print(f"found in symbol table, replacing {line} with @{symbol_table[line[1:]]}")
-            output.append(f"@{symbol_table[line[1:]]}")
-        else:
-            output.append(line)
-    return output
-
-cleaned_data = clean_data(input_data)
-
-# first pass, translate from symbol table
-first_pass_data = first_pass(cleaned_data)
-# second pass, translate user-defined symbols
-
-# insert label symbols to symbol table
-symbol_table = add_label_symbols(first_pass_data, symbol_table)
-# insert variable symbols to symbol table
-symbol_table = add_variable_symbols(first_pass_data, symbol_table)
+binary_output = second_pass(instructions, symbol_table)
 
 if DEBUG:
     print(symbol_table)
 
-# replace all symbols
-replaced_data = replace_symbols(first_pass_data, symbol_table)
-
-# translate output now...
-binary_output = translate_to_binary(replaced_data)
-
-for line in binary_output:
-    print(line)
+# single write for the whole program instead of a print per instruction
+sys.stdout.write("\n".join(binary_output) + "\n")
 
 # write to file by just piping to file
 # use diff to compare results
\ No newline at end of file
@@ -1,11 +1,13 @@
 from io import TextIOWrapper
 import argparse
-from typing import List, Union, Literal
-from dataclasses import dataclass
+from typing import Iterator, List, NamedTuple, Tuple, Union, Literal
 from enum import Enum
 import pathlib
 from os.path import isdir
-from os import listdir
+from os import scandir
+import os
+import sys
+import re
 
 
 # non-pythonic class definitions and method names are from project instructions for consistency
@@ -41,17 +43,37 @@ class SegmentTypes(Enum):
     TEMP = "temp"
     POINTER = "pointer"
 
+# lookups from the first token of a VM command / segment name to its type
+command_lookup = {
+    "pop": CommandType.C_POP,
+    "push": CommandType.C_PUSH,
+    "return": CommandType.C_RETURN,
+    "label": CommandType.C_LABEL,
+    "goto": CommandType.C_GOTO,
+    "if-goto": CommandType.C_IFGOTO,
+    "function": CommandType.C_FUNCTION,
+    "call": CommandType.C_CALL,
+    **{cmd.value: CommandType.C_ARITHMETIC for cmd in ArithmeticCommandTypes},
+}
+arithmetic_lookup = {cmd.value: cmd for cmd in ArithmeticCommandTypes}
+segment_lookup = {segment.value: segment for segment in SegmentTypes}
+# a comment runs from // to the end of its line
+comment_pattern = re.compile(r"//[^\n]*")
+
 class Parser():
     # parses each VM command into its lexical elements
 
-    @dataclass
-    class FileLines():
+    class FileLines(NamedTuple):
         filename: str
         lines: List[str]
 
     fileReader: TextIOWrapper
-    line_index:int = 0
-    lines: List[str] = []
+    # cleaned lines of every file, paired with the file they came from
+    lines: List[Tuple[str, str]] = []
+    curr_line: str = ""
+    # current line split into tokens, and its command type once looked up
+    tokens: List[str] = []
+    command_type: Union[CommandType, None] = None
     file_data: List[FileLines]
 
     def __init__(self, file_location):
@@ -59,192 +81,278 @@ class Parser():
 
         # Find if file_location is directory, load all .vm files if so
         if isdir(file_location):
-            for file in listdir(file_location):
-                if file.endswith(".vm"):
-                    if DEBUG:
-                        print(f"reading lines from file : {file}")
-                    self.fileReader = open(f"{file_location}/{file}", "r")
-                    lines = self.fileReader.readlines()
-                    self.fileReader.close()
-                    fileLines = self.FileLines(filename=file.strip(".vm"),lines=lines)
-                    self.file_data.append(fileLines)
-
+            with scandir(file_location) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".vm"):
+                        self.readFileLines(entry.path)
         else:
-            if DEBUG:
-                print(f"reading lines from file : {file_location}")
-            self.fileReader = open(file_location, "r")
-            lines = self.fileReader.readlines()
-            self.fileReader.close()
-            path = pathlib.PurePath(file_location)
-            fileLines = self.FileLines(filename=path.name.strip(".vm"),lines=lines)
-            self.file_data.append(fileLines)
-
-        self.lines = self.cleanLines(self.lines)
-        self.line_index = 0
-
-    def useFileLines(self, file:FileLines):
-        self.lines = self.cleanLines(file.lines)
-        self.line_index = 0
-    
-    def cleanLines(self, lines: List[str]) -> List[str]:
-        # just read the whole file, trim out whitespace, empty lines
-        cleanLines = []
-        for line in lines:
-            cleanLine = self.trimLine(line)
-            if cleanLine == "\n":
-                continue
-            cleanLines.append(cleanLine)
-        return cleanLines
-
-    def trimLine(self, line):
-        # if DEBUG:
-        #     print(f"trimming line:'{line}' ")
-        # remove comments and whitespace
-        lstripped = line.lstrip()
-        # remove lines that start with comment
-        if lstripped[0:2] == "//":
-            # if DEBUG:
-            #     print("trimmed to '\n'")
-            return "\n"
-        # remove comments at end of line
-        if "//" in lstripped:
-            lstripped = lstripped.split('//')[0]
-
-        # strip newlines
-        line_trimmed = lstripped.rstrip()
-        # if DEBUG:
-        #     print(f"trimmed to:'{line_trimmed}'")
-        return line_trimmed
+            self.readFileLines(file_location)
 
-    def hasMoreLines(self) -> bool:
-        if self.line_index >= len(self.lines) -1:
-            return False
-        return True
+        self.lines = [
+            (file.filename, line)
+            for file in self.file_data
+            for line in self.cleanLines(file.lines)
+        ]
 
-    def advance(self):
-        if self.hasMoreLines():
-            self.line_index += 1
-            # print(f"advanced to line: {self.curr_line}")
+    def readFileLines(self, file_location):
+        if DEBUG:
+            print(f"reading lines from file : {file_location}")
+        self.fileReader = open(file_location, "r", buffering=65536)
+        # strip comments from the whole file at once, then split it
+        lines = comment_pattern.sub("", self.fileReader.read()).split("\n")
+        self.fileReader.close()
+        # static labels use the file name without its .vm extension,
+        # interned as it ends up in every static push/pop of the file
+        filename = sys.intern(pathlib.PurePath(file_location).stem)
+        self.file_data.append(self.FileLines(filename=filename, lines=lines))
 
-    @property
-    def curr_line(self) -> str:
-        return self.lines[self.line_index]
+    def cleanLines(self, lines: List[str]) -> List[str]:
+        # trim out whitespace and empty lines, comments are already gone
+        return [line for line in map(str.strip, lines) if line]
+
+    # step through every file's lines, making each the current line
+    def commands(self) -> Iterator[Tuple[str, str]]:
+        for file_name, line in self.lines:
+            self.curr_line = line
+            self.tokens = line.split(" ")
+            self.command_type = None
+            yield file_name, line
 
     # Ex input: "push constant 10", returns C_PUSH
     @property
     def commandType(self) -> CommandType:
-        command = self.curr_line.split(" ")[0]
+        if self.command_type is not None:
+            return self.command_type
+        command = self.tokens[0]
         # if DEBUG:
         #     print(f"command: {command}")
-        if command == "pop":
-            return CommandType.C_POP
-        elif command == "push":
-            return CommandType.C_PUSH
-        elif command == "return":
-            return CommandType.C_RETURN
-        elif command in [cmd.value for cmd in ArithmeticCommandTypes]:
-            return CommandType.C_ARITHMETIC
-        elif command == "label":
-            return CommandType.C_LABEL
-        elif command == "goto":
-            return CommandType.C_GOTO
-        elif command == "if-goto":
-            return CommandType.C_IFGOTO
-        elif command == "function":
-            return CommandType.C_FUNCTION
-        elif command == "return":
-            return CommandType.C_RETURN
-        elif command == "call":
-            return CommandType.C_CALL
-        raise Exception(f"Cannot find command type for '{command}'")
+        if command not in command_lookup:
+            raise Exception(f"Cannot find command type for '{command}'")
+        self.command_type = command_lookup[command]
+        return self.command_type
     
     @property
     def arithmeticCommandType(self) -> ArithmeticCommandTypes:
-        command = self.curr_line.split(" ")[0]
+        command = self.tokens[0]
         # if DEBUG:
         #     print(f"command: {command}")
-
-        for cmd in ArithmeticCommandTypes:
-            if command == cmd.value:
-                return cmd
-        raise Exception(f"Cannot find command type for '{command}'")
+        if command not in arithmetic_lookup:
+            raise Exception(f"Cannot find command type for '{command}'")
+        return arithmetic_lookup[command]
 
     # Return first argument. If C_ARITHMETIC, return command
     def arg1(self) -> str:
-        if self.commandType == CommandType.C_RETURN:
+        commandType = self.commandType
+        if commandType == CommandType.C_RETURN:
             raise Exception("arg1 cannot be called when command type is CommandType.C_RETURN")
-        if self.commandType == CommandType.C_ARITHMETIC:
+        if commandType == CommandType.C_ARITHMETIC:
             if DEBUG:
-                print(f"arg1 called for arithmetic command {self.commandType}, not expected")
-            return self.curr_line.split(" ")[0]
-        return self.curr_line.split(" ")[1]
+                print(f"arg1 called for arithmetic command {commandType}, not expected")
+            return self.tokens[0]
+        return self.tokens[1]
     
     def getSegmentType(self, segment_name: str) -> SegmentTypes:
-        if segment_name == "local":
-            return SegmentTypes.LOCAL
-        elif segment_name == "argument":
-            return SegmentTypes.ARGUMENT
-        elif segment_name == "this":
-            return SegmentTypes.THIS
-        elif segment_name == "that":
-            return SegmentTypes.THAT
-        elif segment_name == "constant":
-            return SegmentTypes.CONSTANT
-        elif segment_name == "static":
-            return SegmentTypes.STATIC
-        elif segment_name == "temp":
-            return SegmentTypes.TEMP
-        elif segment_name == "pointer":
-            return SegmentTypes.POINTER
-        raise Exception(f"Unexpected segment type encountered {segment_name}")
+        if segment_name not in segment_lookup:
+            raise Exception(f"Unexpected segment type encountered {segment_name}")
+        return segment_lookup[segment_name]
 
     def arg2(self) -> int:
-        if self.commandType == CommandType.C_RETURN:
+        commandType = self.commandType
+        if commandType == CommandType.C_RETURN:
             raise Exception("arg2 cannot be called when command type is CommandType.C_RETURN")
-        if self.commandType not in [CommandType.C_PUSH, CommandType.C_POP, CommandType.C_FUNCTION, CommandType.C_CALL]:
-            raise Exception(f"arg2 cannot be called when command type is {self.commandType}")
-        return self.curr_line.split(" ")[2]
+        if commandType not in [CommandType.C_PUSH, CommandType.C_POP, CommandType.C_FUNCTION, CommandType.C_CALL]:
+            raise Exception(f"arg2 cannot be called when command type is {commandType}")
+        return self.tokens[2]
 
 
 class CodeWriter():
     # writes the assembly code that implements the parsed command
 
-    fileWriter: TextIOWrapper
+    output: bytearray
+    fileDescriptor: int
     stack: List[str] = []
     labelCounter: int = 0
     file_name: str
 
+    # asm for each arithmetic command, the comparisons are formatted with
+    # the jump labels for the current command
+    # all commands pop the first time into A register,
+    # NOT or NEG just modify the popped value
+    # the others pop a second time then calc, or compare and
+    # jump to set the stack to True (-1) or False (0)
+    arithmeticTemplates = {
+        ArithmeticCommandTypes.NOT: "@SP\nA=M-1\nM=!M",
+        ArithmeticCommandTypes.NEG: "@SP\nA=M-1\nM=-M",
+        ArithmeticCommandTypes.AND: "@SP\nA=M-1\nD=M\nA=A-1\nM=D&M\n@SP\nM=M-1",
+        ArithmeticCommandTypes.OR: "@SP\nA=M-1\nD=M\nA=A-1\nM=D|M\n@SP\nM=M-1",
+        ArithmeticCommandTypes.ADD: "@SP\nA=M-1\nD=M\nA=A-1\nM=D+M\n@SP\nM=M-1",
+        ArithmeticCommandTypes.SUB: "@SP\nA=M-1\nD=M\nA=A-1\nM=M-D\n@SP\nM=M-1",
+        **{
+            command: (
+                "@SP\nA=M-1\nD=M\nA=A-1\n"
+                # Get difference for comparison
+                "D=M-D\n"
+                # Jump if the statement is True.
+                "@{jumpLabel}\n" + jump + "\n"
+                # Else update the Stack to False.
+                "@SP\nA=M-1\nA=A-1\nM=0\n"
+                "@{endLabel}\n0;JMP\n"
+                # Jump label for the True state.
+                "({jumpLabel})\n"
+                "@SP\nA=M-1\nA=A-1\nM=-1\n"
+                "({endLabel})\n"
+                # Adjust stack top
+                "@SP\nM=M-1"
+            )
+            for command, jump in [
+                (ArithmeticCommandTypes.LT, "D;JLT"),
+                (ArithmeticCommandTypes.GT, "D;JGT"),
+                (ArithmeticCommandTypes.EQ, "D;JEQ"),
+            ]
+        },
+    }
+    # indices are 15 bit values, keep their strings around so hot
+    # push/pop runs don't convert the same ints over and over
+    indexStrings = [str(i) for i in range(32768)]
+
+    comparisonCommands = frozenset([
+        ArithmeticCommandTypes.LT,
+        ArithmeticCommandTypes.GT,
+        ArithmeticCommandTypes.EQ,
+    ])
+
+    # From slides:
+    # // push local i
+    # addr ← LCL + i
+    # RAM[SP] ← RAM[addr]
+    # SP++
+    # Every push (and each value saved by a call) ends by writing D to
+    # RAM[SP] and incrementing SP
+    pushTail = "@SP\nA=M\nM=D\n@SP\nM=M+1"
+    pushTemplates = {
+        # constant: accessing constant i should result in supplying the constant i
+        SegmentTypes.CONSTANT: "@{index}\nD=A\n" + pushTail,
+        # static: accessing static i within file Foo.vm should result in accessing
+        # the assembly variable Foo.i
+        SegmentTypes.STATIC: "@{file_name}.{index}\nD=M\n" + pushTail,
+        # local, argument, this, that:
+        # allocated dynamically to the RAM (in project 8)
+        # The base addresses of these allocations are kept in the segment pointers LCL, ARG, THIS, THAT
+        # accessing segment i should result in accessing RAM[segmentPointer + i]
+        SegmentTypes.LOCAL: "@{index}\nD=A\n@LCL\nA=M\nA=D+A\nD=M\n" + pushTail,
+        SegmentTypes.ARGUMENT: "@{index}\nD=A\n@ARG\nA=M\nA=D+A\nD=M\n" + pushTail,
+        SegmentTypes.THIS: "@{index}\nD=A\n@THIS\nA=M\nA=D+A\nD=M\n" + pushTail,
+        SegmentTypes.THAT: "@{index}\nD=A\n@THAT\nA=M\nA=D+A\nD=M\n" + pushTail,
+        # temp: fixed segment, mapped on RAM addresses 5-12.
+        # accessing temp i should result in accessing RAM[5 + i]
+        SegmentTypes.TEMP: "@{index}\nD=A\n@5\nA=D+A\nD=M\n" + pushTail,
+        # pointer: fixed segment, mapped on RAM addresses 3-4.
+        # accessing pointer 0 should result in accessing THIS accessing pointer 1 should result in accessing THAT
+        SegmentTypes.POINTER: "@{pointer}\nA=M\nD=A\n" + pushTail,
+    }
+
+    # // pop local i
+    # addr ← LCL + i
+    # SP--
+    # RAM[addr] ← RAM[SP]
+    # Pops store addr in R13 first (D is needed for RAM[SP]), then copy
+    # RAM[SP-1] into RAM[R13] and decrement SP
+    popTail = "@SP\nA=M-1\nD=M\n@R13\nA=M\nM=D\n@SP\nM=M-1"
+    popTemplates = {
+        # static pops straight into the Foo.i variable
+        SegmentTypes.STATIC: "@SP\nA=M-1\nD=M\n@{file_name}.{index}\nM=D\n@SP\nM=M-1",
+        SegmentTypes.LOCAL: "@{index}\nD=A\n@LCL\nA=M\nD=D+A\n@R13\nM=D\n" + popTail,
+        SegmentTypes.ARGUMENT: "@{index}\nD=A\n@ARG\nA=M\nD=D+A\n@R13\nM=D\n" + popTail,
+        SegmentTypes.THIS: "@{index}\nD=A\n@THIS\nA=M\nD=D+A\n@R13\nM=D\n" + popTail,
+        SegmentTypes.THAT: "@{index}\nD=A\n@THAT\nA=M\nD=D+A\n@R13\nM=D\n" + popTail,
+        SegmentTypes.TEMP: "@{index}\nD=A\n@5\nD=D+A\n@R13\nM=D\n" + popTail,
+        # RAM[R13] = THIS|THAT
+        SegmentTypes.POINTER: "@{pointer}\nD=A\n@R13\nM=D\n" + popTail,
+    }
+
+    # push/pop asm, by command then segment, formatted with the index,
+    # the static file label and the pointer register (THIS|THAT)
+    pushPopTemplates = {
+        CommandType.C_PUSH: pushTemplates,
+        CommandType.C_POP: popTemplates,
+    }
+
+    # asm for a call, formatted with the callee, its arg count and the
+    # label to return to
+    callTemplate = "\n".join([
+        # Save return address
+        "@{returnAddrLabel}", "D=A", pushTail,
+        # Save caller's segment pointers
+        "@LCL", "D=M", pushTail,
+        "@ARG", "D=M", pushTail,
+        "@THIS", "D=M", pushTail,
+        "@THAT", "D=M", pushTail,
+        # ARG=SP–5–nArgs //RepositionsARG
+        "@SP", "D=M", "@5", "D=D-A", "@{nArgs}", "D=D-A", "@ARG", "M=D",
+        # LCL = SP // Repositions LCL
+        "@SP", "D=M", "@LCL", "M=D",
+        # goto function_name // Transfers control to the callee
+        "@{function_name}", "0;JMP",
+        "({returnAddrLabel})",
+    ])
+
+    # asm for a return, it's the same for every function
+    # @endframe and @retAddr are general purpose variables
+    returnAsm = "\n".join([
+        # endFrame = LCL // store the end of the frame in general purpose memory
+        "@LCL", "D=M", "@endframe", "M=D",
+        # retAddr = *(endFrame – 5) // store the return address in general purpose memory
+        "@endframe", "D=M", "@5", "D=D-A", "A=D", "D=M", "@retAddr", "M=D",
+        # *ARG = pop()
+        "@SP", "A=M-1", "D=M", "@ARG", "A=M", "M=D", "@SP", "M=M-1",
+        # SP = ARG + 1
+        "@ARG", "D=M+1", "@SP", "M=D",
+        # Set THAT, THIS, ARG, LOCAL = endFrame - n
+        "@endframe", "D=M", "@1", "A=D-A", "D=M", "@THAT", "M=D",
+        "@endframe", "D=M", "@2", "A=D-A", "D=M", "@THIS", "M=D",
+        "@endframe", "D=M", "@3", "A=D-A", "D=M", "@ARG", "M=D",
+        "@endframe", "D=M", "@4", "A=D-A", "D=M", "@LCL", "M=D",
+        # Go to return address
+        "@retAddr", "A=M", "0;JMP",
+    ])
+
     def __init__(self, file_location):
         path = pathlib.PurePath(file_location)
         self.file_location = path.name
-        self.fileWriter = open(file_location, "w")
+        # the whole program is kept in memory and written once on close
+        self.output = bytearray()
+        self.fileDescriptor = os.open(
+            file_location, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         self.file_name = ""
-
-    @property
-    def jumpLabel(self):
-        return f"COND_JUMP.{self.labelCounter}"
-
-    @property
-    def endLabel(self):
-        return f"COND_JUMP_END.{self.labelCounter}"
+        # pick the writer once so emitting asm never re-checks DEBUG
+        self.writeAsm = self.writeAsmDebug if DEBUG else self.writeAsmFast
 
     def close(self):
-        self.fileWriter.close()
+        written = 0
+        with memoryview(self.output) as data:
+            while written < len(data):
+                written += os.write(self.fileDescriptor, data[written:])
+        os.close(self.fileDescriptor)
+
+    # write a whole command's asm in one call, the comment parts
+    # describe the VM command and are only used when debugging
+    def writeAsmFast(self, asm: List[str], *comment):
+        self.output += ("\n".join(asm) + "\n").encode("ascii")
+
+    def writeAsmDebug(self, asm: List[str], *comment):
+        asmBlock = "\n".join([f"// {' '.join(map(str, comment))}", *asm])
+        print(asmBlock)
+        self.output += f"{asmBlock}\n".encode("ascii")
 
     def bootstrap(self):
         asm = []
-        if DEBUG:
-            asm.append(f"// bootstrapping code")
 
         asm.append(f"@256")
         asm.append(f"D=A")
         asm.append(f"@SP")
         asm.append(f"M=D")
         
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")        
+        self.writeAsm(asm, "bootstrapping code")
         
         self.writeCall("Sys.init", 0)
 
@@ -255,24 +363,18 @@ class CodeWriter():
         • Initialize the local segment of the callee
         """
         asm = []
-        if DEBUG:
-            asm.append(f"// function {function_name} {nArgs}")
         
         asm.append(f"({function_name})")
         # Loop nArgs times, setting local segment to 0
         for _ in range(nArgs):
-            asm.extend(self.getPushAsm(SegmentTypes.CONSTANT, 0))
+            asm.append(self.getPushPopAsm(CommandType.C_PUSH, SegmentTypes.CONSTANT, 0))
 
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        self.writeAsm(asm, "function", function_name, nArgs)
 
     def writeCall(self, function_name:str, nArgs:int):
+        self.labelCounter += 1
         returnAddrLabel = f"{function_name}.RETURN.{self.labelCounter}"
         asm = []
-        if DEBUG:
-            asm.append(f"// call {function_name} {nArgs}")
 
         """
         We have to:
@@ -294,50 +396,9 @@ class CodeWriter():
         goto function_name // Transfers control to the callee
         (retAddrLabel) // Injects this label into the code        
         """        
-        # Save return address
-        asm.append(f"@{returnAddrLabel}")
-        asm.append(f"D=A")
-        asm.append(f"@SP")
-        asm.append(f"A=M")
-        asm.append(f"M=D")
-        asm.append(f"@SP")
-        asm.append(f"M=M+1")
-
-        # Save caller's segment pointers
-        for segment in ["@LCL", "@ARG","@THIS", "@THAT"]:
-            asm.append(segment)
-            asm.append(f"D=M")
-            asm.append(f"@SP")
-            asm.append(f"A=M")
-            asm.append(f"M=D")
-            asm.append(f"@SP")
-            asm.append(f"M=M+1")
-
-        # ARG=SP–5–nArgs //RepositionsARG
-        asm.append(f"@SP")
-        asm.append(f"D=M")
-        asm.append(f"@5")
-        asm.append(f"D=D-A")
-        asm.append(f"@{nArgs}")
-        asm.append(f"D=D-A")
-        asm.append(f"@ARG")
-        asm.append(f"M=D")
-
-        # LCL = SP // Repositions LCL
-        asm.append(f"@SP")
-        asm.append(f"D=M")
-        asm.append(f"@LCL")
-        asm.append(f"M=D")
-
-        # goto function_name // Transfers control to the callee
-        asm.append(f"@{function_name}")
-        asm.append(f"0;JMP")
-
-        asm.append(f"({returnAddrLabel})")
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        asm.append(self.callTemplate.format(
+            returnAddrLabel=returnAddrLabel, nArgs=nArgs, function_name=function_name))
+        self.writeAsm(asm, "call", function_name, nArgs)
 
 
     def writeReturn(self):
@@ -348,91 +409,25 @@ class CodeWriter():
         3. Reinstate the caller’s segment pointers
         4. Jump to the return address
         """
-        asm = []
-        if DEBUG:
-            asm.append(f"// return")
-        
-        # endFrame = LCL // store the end of the frame in general purpose memory
-        asm.append("@LCL")
-        asm.append("D=M")
-        asm.append("@endframe") # @endframe == R13
-        asm.append("M=D")
-        # retAddr = *(endFrame – 5) // store the return address (endframe - 5) in general purpose memory
-        # load RAM[endFrame] into D
-        asm.append("@endframe")
-        asm.append("D=M")
-        # D = RAM[RAM[endFrame] - 5]
-        asm.append("@5")
-        asm.append("D=D-A")
-        asm.append("A=D")
-        asm.append("D=M")
-        asm.append("@retAddr")
-        asm.append("M=D")
-        # *ARG = pop()
-        asm.append("@SP")
-        asm.append("A=M-1")
-        asm.append("D=M")
-        asm.append("@ARG")
-        asm.append("A=M")
-        asm.append("M=D")
-        asm.append("@SP")
-        asm.append("M=M-1")
-        # SP = ARG + 1
-        asm.append("@ARG")
-        asm.append("D=M+1")
-        asm.append("@SP")
-        asm.append("M=D")
-        # Set THAT, THIS, ARG, LOCAL = endFrame - n
-        n = 1
-        for segment in ["THAT", "THIS", "ARG", "LCL"]:
-            asm.append("@endframe") # @endframe == R13 (general purpose register)
-            asm.append("D=M")
-            asm.append(f"@{n}")
-            asm.append("A=D-A")
-            asm.append("D=M")
-            asm.append(f"@{segment}")
-            asm.append("M=D")
-            n += 1
-
-        # Go to return address
-        asm.append("@retAddr")
-        asm.append("A=M")
-        asm.append("0;JMP")
-
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        self.writeAsm([self.returnAsm], "return")
 
 
     def writeLabel(self, label: str):
         asm = []
-        if DEBUG:
-            asm.append(f"// label {label}")
         
         asm.append(f"({label})")
 
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        self.writeAsm(asm, "label", label)
 
     def writeGoto(self, label:str):
         asm = []
-        if DEBUG:
-            asm.append(f"// goto {label}")
         asm.append(f"@{label}")
         asm.append("0;JMP")
 
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        self.writeAsm(asm, "goto", label)
 
     def writeIfGoto(self, label:str):
         asm = []
-        if DEBUG:
-            asm.append(f"// if-goto {label}")
         # Pop off stack, into D reg
         asm.append("@SP")
         asm.append("A=M-1")
@@ -444,288 +439,78 @@ class CodeWriter():
         asm.append(f"@{label}")
         asm.append("D;JNE")
         
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
+        self.writeAsm(asm, "if-goto", label)
 
     def writeArithmetic(self, command: ArithmeticCommandTypes):
-        if DEBUG:
-            print(f"writeArithmetic command: {command}")
         asm = []
-        if DEBUG:
-            asm.append(f"// {command}")
-        asm.extend(self.getArithmeticAsm(command))
+        asm.append(self.getArithmeticAsm(command))
         
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
-
-    def getArithmeticAsm(self, command:ArithmeticCommandTypes) -> List[str]:
-        asm = []
-        # all commands pop the first time into A register
-        asm.append("@SP")
-        asm.append("A=M-1")
-        # NOT or NEG just modify the popped value
-        if command == ArithmeticCommandTypes.NOT:
-            asm.append("M=!M")
-            return asm
-        if command == ArithmeticCommandTypes.NEG:
-            asm.append("M=-M")
-            return asm
-        # Some commands pop a second time
-        asm.append("D=M")
-        asm.append("A=A-1")
-
-        # ADD SUB AND OR are just calcs
-        if command == ArithmeticCommandTypes.AND:
-            asm.append("M=D&M")
-        elif command == ArithmeticCommandTypes.OR:
-            asm.append("M=D|M")
-        elif command == ArithmeticCommandTypes.ADD:
-            asm.append("M=D+M")
-        elif command == ArithmeticCommandTypes.SUB:
-            asm.append("M=M-D")
-        elif command in [ArithmeticCommandTypes.LT, ArithmeticCommandTypes.GT, ArithmeticCommandTypes.EQ]:
-            # Get difference for comparison
-            asm.append("D=M-D")
-
-            asm.append(f"@{self.jumpLabel}")
-            # Jump if the statement is True.
-            # Else update the Stack to False.
-            if command == ArithmeticCommandTypes.LT:
-                asm.append("D;JLT")
-            elif command == ArithmeticCommandTypes.GT:
-                asm.append("D;JGT")
-            elif command == ArithmeticCommandTypes.EQ:
-                asm.append("D;JEQ")
-            # Push false to stack -1
-            asm.append("@SP")
-            asm.append("A=M-1")
-            asm.append("A=A-1")
-            asm.append("M=0")
-            asm.append(f"@{self.endLabel}")
-            asm.append('0;JMP')
-            # # Jump label for the True state.
-            asm.append(f"({self.jumpLabel})")
-            asm.append('@SP')
-            asm.append('A=M-1')
-            asm.append('A=A-1')
-            asm.append('M=-1')
-            asm.append(f"({self.endLabel})")
-
-        # Adjust stack top
-        asm.append('@SP')
-        asm.append('M=M-1')
-        return asm
+        self.writeAsm(asm, command)
+
+    def getArithmeticAsm(self, command:ArithmeticCommandTypes) -> str:
+        template = self.arithmeticTemplates[command]
+        if command not in self.comparisonCommands:
+            return template
+        # only comparisons need a fresh unique label
+        self.labelCounter += 1
+        return template.format(
+            jumpLabel=f"COND_JUMP.{self.labelCounter}",
+            endLabel=f"COND_JUMP_END.{self.labelCounter}")
     
     def writePushPop(self, command: Literal[CommandType.C_PUSH, CommandType.C_POP], segment: SegmentTypes, index: int):
-        if DEBUG:
-            print(f"writePushPop command: {command}")
-        asm = []
-        if DEBUG:
-            asm.append(f"// {command} {segment} {index}")
-        if command == CommandType.C_PUSH:
-            asm.extend(self.getPushAsm(segment, int(index)))
-        elif command == CommandType.C_POP:
-            asm.extend(self.getPopAsm(segment, int(index)))
-
-        for asmLine in asm:
-            if DEBUG:
-                print(f"{asmLine}")
-            self.fileWriter.write(f"{asmLine}\n")
-
-
-    def getPushAsm(self, segment: SegmentTypes, index: int) -> List[str]:
         asm = []
-        temp = "5"
-        # From slides:
-        # // push local i 
-        # addr ← LCL + i
-        # RAM[SP] ← RAM[addr] 
-        # SP++
+        asm.append(self.getPushPopAsm(command, segment, index))
 
-        if segment == SegmentTypes.CONSTANT:
-            # constant: accessing constant i should result in supplying the constant i
+        self.writeAsm(asm, command, segment, index)
 
-            # Put constant in D register
-            asm.append(f"@{index}")
-            asm.append(f"D=A")
-
-        elif segment == SegmentTypes.STATIC:
-            # static: accessing static i within file Foo.vm should result in accessing
-            # the assembly variable Foo.i
-
-            # Put label in D register
-            asm.append(f"@{self.file_name}.{index}")
-            asm.append("D=M")
-
-        # local, argument, this, that:
-        # allocated dynamically to the RAM (in project 8)
-        # The base addresses of these allocations are kept in the segment pointers LCL, ARG, THIS, THAT
-        # accessing segment i should result in accessing RAM[segmentPointer + i]
-        elif segment in [SegmentTypes.LOCAL,SegmentTypes.ARGUMENT, SegmentTypes.THIS, SegmentTypes.THAT]:
-            # Add up segmentPointer + index
-
-            # Put index in D register for adding
-            asm.append(f"@{index}")
-            asm.append(f"D=A")
-            # Put segmentPointer in A register
-            if segment == SegmentTypes.LOCAL:
-                asm.append("@LCL")
-            elif segment == SegmentTypes.ARGUMENT:
-                asm.append("@ARG")
-            elif segment == SegmentTypes.THIS:
-                asm.append("@THIS")
-            elif segment == SegmentTypes.THAT:
-                asm.append("@THAT")
-            asm.append("A=M")
-            # Add index + segmentPointer, put into A
-            asm.append("A=D+A")
-            # Put the source value into D (used to set SP later)
-            asm.append("D=M")
-
-        elif segment == SegmentTypes.TEMP:
-            # temp: fixed segment, mapped on RAM addresses 5-12.
-            # accessing temp i should result in accessing RAM[5 + i]
-            # For now just use @5 for temp
-
-            # Put index in D register for adding
-            asm.append(f"@{index}")
-            asm.append(f"D=A")
-            # Put temp in A reg for adding
-            asm.append(f"@{temp}")
-            # Add index + temp, put into A
-            asm.append("A=D+A")
-            # Put the source value into D (used to set SP later)
-            asm.append("D=M")
-
-        elif segment == SegmentTypes.POINTER:
-            # pointer: fixed segment, mapped on RAM addresses 3-4.
-            # accessing pointer 0 should result in accessing THIS accessing pointer 1 should result in accessing THAT
-            # RAM[SP] = THIS|THAT
-            pointerType = ""
-            if index == 0:
-                pointerType = "THIS"
-            else:
-                pointerType = "THAT"
-
-            asm.append(f"@{pointerType}")
-            # A = RAM[THIS]
-            asm.append(f"A=M") 
-            # Put RAM[THIS] in D reg
-            asm.append(f"D=A")
- 
-        # RAM[SP] = D
-        asm.append(f"@SP")
-        asm.append(f"A=M")
-        asm.append(f"M=D")
+    def getPushPopAsm(self, command: Literal[CommandType.C_PUSH, CommandType.C_POP], segment: SegmentTypes, index: int) -> str:
+        if command == CommandType.C_POP and segment == SegmentTypes.CONSTANT:
+            raise Exception("Cannot pop with 'constant' segment")
+        # pointer 0 is THIS, pointer 1 is THAT
+        pointer = "THIS" if index == 0 else "THAT"
+        return self.pushPopTemplates[command][segment].format(
+            index=self.indexStrings[index], file_name=self.file_name,
+            pointer=pointer)
 
-        # Increment stack pointer
-        asm.append(f"@SP")
-        asm.append(f"M=M+1")
 
-        return asm
 
-    def getPopAsm(self, segment: SegmentTypes, index: int) -> List[str]:
-        # // pop local i 
-        # addr ← LCL + i
-        # SP--
-        # RAM[addr] ← RAM[SP]
+# translate the parser's current line with the matching CodeWriter method
+def translate_arithmetic(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeArithmetic(parser.arithmeticCommandType)
 
-        asm = []
-        temp = "5"
-        general_use = "R13"
+def translate_push_pop(parser: Parser, codeWriter: CodeWriter):
+    segment = parser.getSegmentType(parser.arg1())
+    codeWriter.writePushPop(parser.commandType, segment, int(parser.arg2()))
 
-        if segment == SegmentTypes.CONSTANT:
-            raise Exception("Cannot pop with 'constant' segment")
+def translate_label(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeLabel(parser.arg1())
 
-        if segment == SegmentTypes.STATIC:
-            # Set A reg to RAM[SP]-1
-            asm.append("@SP")
-            asm.append("A=M-1")
-            # D reg = RAM[A]
-            asm.append("D=M")
-            asm.append(f"@{self.file_name}.{index}")
-            asm.append("M=D")
-            # SP--
-            asm.append("@SP")
-            asm.append("M=M-1")
-            return asm
-
-        # addr ← LCL + i
-        if segment in [SegmentTypes.LOCAL,
-                        SegmentTypes.ARGUMENT, 
-                        SegmentTypes.THIS, 
-                        SegmentTypes.THAT, 
-                        SegmentTypes.TEMP]:
-            # Add up segmentPointer + index
-
-            asm.append(f"@{index}")
-            asm.append(f"D=A")
-            # Put segmentPointer in A register
-            if segment == SegmentTypes.LOCAL:
-                asm.append("@LCL")
-                asm.append("A=M")
-                asm.append("D=D+A")
-            elif segment == SegmentTypes.ARGUMENT:
-                asm.append("@ARG")
-                asm.append("A=M")
-                asm.append("D=D+A")
-            elif segment == SegmentTypes.THIS:
-                asm.append("@THIS")
-                asm.append("A=M")
-                asm.append("D=D+A")
-            elif segment == SegmentTypes.THAT:
-                asm.append("@THAT")
-                asm.append("A=M")
-                asm.append("D=D+A")
-            elif segment == SegmentTypes.TEMP:
-                asm.append(f"@{temp}")
-                asm.append("D=D+A")
-
-            # Store the addr value in R13 for later use. (Need D reg for RAM[SP])
-            asm.append(f"@{general_use}")
-            asm.append("M=D")
-
-        elif segment == SegmentTypes.POINTER:
-            # RAM[SP] = THIS|THAT
-            pointerType = ""
-            if index == 0:
-                pointerType = "THIS"
-            else:
-                pointerType = "THAT"
-            asm.append(f"@{pointerType}")
-            # Put RAM[THIS] in D reg
-            asm.append(f"D=A")
-            
-            # Store the addr value in R13 for later use. (Need D reg for RAM[SP])
-            asm.append(f"@{general_use}")
-            asm.append("M=D")
-
-        # Now do RAM[addr] ← RAM[SP]
-
-        # A reg = RAM[SP]-1
-        asm.append(f"@SP")
-        asm.append(f"A=M-1")
+def translate_goto(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeGoto(parser.arg1())
 
-        # Set D reg to RAM[SP]
-        asm.append(f"D=M")
+def translate_if_goto(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeIfGoto(parser.arg1())
 
-        # Set A = RAM[R13] (RAM[R13] is addr)
-        asm.append(f"@{general_use}")
-        asm.append(f"A=M")
+def translate_function(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeFunction(parser.arg1(), int(parser.arg2()))
 
-        # Set RAM[addr] = D reg
-        asm.append(f"M=D")
+def translate_return(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeReturn()
 
-        # SP-- b/c we want to decrement SP
-        asm.append(f"@SP")
-        asm.append(f"M=M-1")
-    
-        return asm
+def translate_call(parser: Parser, codeWriter: CodeWriter):
+    codeWriter.writeCall(parser.arg1(), int(parser.arg2()))
 
+command_handlers = {
+    CommandType.C_ARITHMETIC: translate_arithmetic,
+    CommandType.C_POP: translate_push_pop,
+    CommandType.C_PUSH: translate_push_pop,
+    CommandType.C_LABEL: translate_label,
+    CommandType.C_GOTO: translate_goto,
+    CommandType.C_IFGOTO: translate_if_goto,
+    CommandType.C_FUNCTION: translate_function,
+    CommandType.C_RETURN: translate_return,
+    CommandType.C_CALL: translate_call,
+}
 
 
 def main():
@@ -756,51 +541,17 @@ def main():
         codeWriter.file_name = parser.file_data[0].filename
         codeWriter.bootstrap()
 
-    for fileLines in parser.file_data:
-        if DEBUG:
-            print(f"using file {fileLines.filename}")
-        parser.useFileLines(fileLines)
-        codeWriter.file_name = fileLines.filename
-
-        # Read in each line and translate it
-        while parser.hasMoreLines():
-            parser.advance()
-            if parser.curr_line == "":
-                continue
-            # Increment label counter so we always have a unique label
-            # needed for jumps during gt, lt, eq
-            codeWriter.labelCounter += 1
-
+    # Read in each line and translate it
+    for file_name, _ in parser.commands():
+        # file names are interned, so only a new file fails the identity check
+        if file_name is not codeWriter.file_name:
             if DEBUG:
-                print(f"interpreting line '{parser.curr_line}'")
-            if parser.commandType == CommandType.C_ARITHMETIC:
-                codeWriter.writeArithmetic(parser.arithmeticCommandType)
-            elif parser.commandType in [CommandType.C_POP, CommandType.C_PUSH]:
-                parser_arg1 = parser.arg1()
-                segment = parser.getSegmentType(parser_arg1)
-                index = parser.arg2()
-                codeWriter.writePushPop(parser.commandType, segment, int(index))
-            elif parser.commandType == CommandType.C_LABEL:
-                label = parser.arg1()
-                codeWriter.writeLabel(label)
-            elif parser.commandType == CommandType.C_GOTO:
-                label = parser.arg1()
-                codeWriter.writeGoto(label)
-            elif parser.commandType == CommandType.C_IFGOTO:
-                label = parser.arg1()
-                codeWriter.writeIfGoto(label)
-            elif parser.commandType == CommandType.C_FUNCTION:
-                functionName = parser.arg1()
-                nArgs = parser.arg2()
-                codeWriter.writeFunction(functionName, int(nArgs))
-            elif parser.commandType == CommandType.C_RETURN:
-                codeWriter.writeReturn()
-            elif parser.commandType == CommandType.C_CALL:
-                functionName = parser.arg1()
-                # filename = functionName.split(".")[0]
-                # function = functionName.split(".")[1]
-                nArgs = parser.arg2()
-                codeWriter.writeCall(functionName, int(nArgs))
+                print(f"using file {file_name}")
+            codeWriter.file_name = file_name
+
+        if DEBUG:
+            print(f"interpreting line '{parser.curr_line}'")
+        command_handlers[parser.commandType](parser, codeWriter)
 
 
     codeWriter.close()
@@ -7,19 +7,26 @@ Given some high-level Jack language files:
 As part of writing a compiler, going from high-level langauge -> VM code -> assembly -> machine code
   
 Next chapter will use this tree representation to generate VM code
+
+Only the standard library is used, so for large inputs it can be run as-is with pypy3:
+  pypy3 SyntaxAnalyser.py --fileread Main.jack --filewrite Main.xml
 """
 
 from io import TextIOWrapper
 import argparse
-from typing import List, Union, Literal, Callable
-from functools import partial
-from inspect import signature
+import sys
+import re
+from typing import List, NamedTuple, Tuple, Union, Literal, TextIO
+from functools import partial, lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
 from dataclasses import dataclass
 from enum import Enum
 import pathlib
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from os.path import isdir
+from os import scandir
+from xml.sax.saxutils import escape
 
 
 class TokenType(Enum):
@@ -33,175 +40,71 @@ class RuleType(Enum):
     pass
 
 # Terminals
-@dataclass
-class Token:
+class Token(NamedTuple):
     type: TokenType
     value: str
 
 # Nonterminals
-@dataclass
-class Rule:
+class Rule(NamedTuple):
     type: RuleType
     value: str
 
 class Tokenizer():
-    lines: List[str]
-    curr_line: int
-    curr_char: int
+    # the whole file, without comments
+    src: str
+    debug: bool
 
     keyword_list: List[str] = ['class', 'constructor', 'function', 'method', 'field', 'static', 'var', 'int', 'char', 'boolean', 'void', 'true', 'false', 'null', 'this', 'let', 'do', 'if', 'else', 'while', 'return']
     symbol_list: List[str] = ['{', '}', '(', ')', '[', ']', '.', ',', ';', '+', '-', '*', '/', '&', '|', '<', '>', '=', '~']
 
-    def __init__(self, lines):
-        self.lines = lines
-        self.curr_line = 0
-        self.curr_char = 0
-        if DEBUG:
-            print(f"Starting tokenizer with {len(lines)} lines")
-            print(f"First line:{self.lines[self.curr_line]}")
-    
-    @property
-    def current_line_len(self) -> int:
-        return len(self.lines[self.curr_line])
-
-    @property
-    def current_char(self) -> str:
-        return self.lines[self.curr_line][self.curr_char]
-
-    @property
-    def remaining_str(self) -> str:
-        return self.lines[self.curr_line][self.curr_char:self.current_line_len]
-
-    def hasMoreTokens(self) -> bool:
-        if self.curr_line >= len(self.lines):
-            return False
-        return True
-
-    def advance(self, num_chars = 1):
-        self.curr_char += num_chars
-        # if DEBUG:
-        #     print(f"Advancing {num_chars} to {self.curr_char}")
-        if self.curr_char >= len(self.lines[self.curr_line]):
-            self.curr_line += 1
-            self.curr_char = 0
-            # if DEBUG:
-            #     print(f"Advanced line to line {self.curr_line}")
-
-    # returns: KEYWORD, SYMBOL, IDENTIFIER, INT_CONST, STRING_CONST
-    def token_type(self) -> Union[TokenType, None]:
-        # is keyword?
-        for keyword in self.keyword_list:
-            keyword_to_check = self.lines[self.curr_line][self.curr_char:self.curr_char+len(keyword)]
-            if keyword_to_check == keyword:
-                return TokenType.KEYWORD
-
-        # is symbol
-        for symbol in self.symbol_list:
-            if self.current_char == symbol:
-                return TokenType.SYMBOL
-
-        # is string?
-        if self.current_char == '"':
-            return TokenType.STRING_CONST
-
-        # integer
-        # separated by whitespace or box bracket
-        whitespace_split = self.remaining_str.split(" ")[0]
-        box_split = whitespace_split.split("[")[0]
-        box_split = box_split.split("(")[0]
-        box_split = box_split.rstrip(";")
-        box_split = box_split.rstrip("]")
-        box_split = box_split.rstrip(")")
-        # print(f"self.remaining_str '{self.remaining_str}', box_split: '{box_split}'")
-        if box_split.isnumeric() or whitespace_split.isnumeric():
-            return TokenType.INT_CONST
-
-        if self.current_char == " ":
-            return None
-        
-        # identifier
-        if not self.current_char.isnumeric():
-            return TokenType.IDENTIFIER
-
-        return None
-
-    # returns: CLASS, METHOD, FUNCTION, CONSTRUCTOR,
-    # INT, BOOLEAN, CHAR, VOID, VAR, STATIC, FIELD, 
-    # LET, DO, IF, ELSE, WHILE, RETURN, TRUE, FALSE, NULL, THIS
-    def key_word(self) -> Union[str, None]:
-        for keyword in self.keyword_list:
-            # if the keyword is longer than the rest of the line, keyword is not present
-            chars_left = self.current_line_len - self.curr_char
-            if len(keyword) > chars_left:
-                continue
-            keyword_to_check = self.lines[self.curr_line][self.curr_char:self.curr_char+len(keyword)]
-            if keyword_to_check == keyword:
-                return keyword
-        return None
-    
-    def symbol(self) -> Union[str, None]:
-        for symbol in self.symbol_list:
-            if self.current_char == symbol:
-                return symbol
-    
-    # identifier: not including double quote or newline '"' a sequence of letters, digits, and
-    # underscore ( '_' ) not starting with a digit    
-    def identifier(self) -> str:
-        untrimmed_str = self.remaining_str.split(" ")[0]
-        # remove any trailing symbols
-        trimmed_str = untrimmed_str
-        for i in range(1, len(untrimmed_str)):
-            if untrimmed_str[-i] in self.symbol_list:
-                # if DEBUG:
-                #     print(f"trimming {untrimmed_str[-i]} from {untrimmed_str}")
-                trimmed_str = trimmed_str.rstrip(untrimmed_str[-i])
-            else:
-                break
-        # if there are any dots in the indentifier, like game.dispose, split and only use first occurence
-        trimmed_str = trimmed_str.split(".")[0]
-        # if there are any square brackets, only use the first piece as well
-        trimmed_str = trimmed_str.split("[")[0]
-        return trimmed_str
-
-    # integerConstant:  a decimal number in the range 0 ... 32767 
-    def int_val(self) -> int:
-        trimmed_str = self.remaining_str.split(" ")[0]
-        trimmed_str = trimmed_str.rstrip(";")
-        trimmed_str = trimmed_str.rstrip("]")
-        trimmed_str = trimmed_str.rstrip(")")
-        return trimmed_str
-
-    # StringConstant:'"' a sequence of Unicode characters,
-    def string_val(self) -> str:
-        return self.remaining_str.split('"')[1]
+    # keywords and symbols are from fixed sets, so every occurrence
+    # shares one token, anything else scanned as a word is an identifier
+    keyword_tokens = {keyword: Token(TokenType.KEYWORD, keyword) for keyword in keyword_list}
+    symbol_tokens = {symbol: Token(TokenType.SYMBOL, symbol) for symbol in symbol_list}
+
+    # each token kind is a group, anything the pattern skips over
+    # between matches is whitespace
+    token_pattern = re.compile("|".join([
+        # StringConstant: '"' a sequence of Unicode characters, not including double quote or newline '"'
+        r'(?P<string>"[^"\n]*")',
+        # integerConstant: a decimal number in the range 0 ... 32767
+        r"(?P<int>[0-9]+)",
+        # keyword or identifier: a sequence of letters, digits, and underscore not starting with a digit
+        r"(?P<word>[A-Za-z_][A-Za-z0-9_]*)",
+        "(?P<symbol>[" + re.escape("".join(symbol_list)) + "])",
+    ]))
+
+    def __init__(self, src, debug: bool = False):
+        self.src = src
+        self.debug = debug
+        if self.debug:
+            print(f"Starting tokenizer with {len(src)} chars")
+            first_line = src.partition("\n")[0]
+            print(f"First line:{first_line}")
 
     def tokenize(self) -> List[Token]:
         tokens: List[Token] = []
-        while self.hasMoreTokens():
-            tokenType = self.token_type()
-            value = ""
-            if tokenType == TokenType.KEYWORD:
-                value = self.key_word()
-            elif tokenType == TokenType.SYMBOL:
-                value = self.symbol()
-            elif tokenType == TokenType.INT_CONST:
-                value = self.int_val()
-            elif tokenType == TokenType.STRING_CONST:
-                value = self.string_val()
-            elif tokenType == TokenType.IDENTIFIER:
-                value = self.identifier()
-            if tokenType == None:
-                self.advance(1)
-                continue
-            if DEBUG:
-                print(f"token: {tokenType} with val {value}")
-            tokens.append(Token(tokenType, value))
-            if value == None or len(value) == 0:
-                self.advance(1)
-            elif tokenType == TokenType.STRING_CONST:
-                self.advance(len(value) + 2) # Advance and remove the string's quotes
+        append = tokens.append
+        keyword_tokens = self.keyword_tokens
+        symbol_tokens = self.symbol_tokens
+        # findall scans the whole source in one call, each match is a tuple
+        # of the groups where only the matching kind is non empty
+        for string, integer, word, symbol in self.token_pattern.findall(self.src):
+            if symbol:
+                append(symbol_tokens[symbol])
+            elif word:
+                token = keyword_tokens.get(word)
+                if token is None:
+                    token = Token(TokenType.IDENTIFIER, sys.intern(word))
+                append(token)
+            elif integer:
+                append(Token(TokenType.INT_CONST, integer))
             else:
-                self.advance(len(value))
+                # drop the quotes
+                append(Token(TokenType.STRING_CONST, string[1:-1]))
+        if self.debug:
+            for token in tokens:
+                print(f"token: {token.type} with val {token.value}")
         return tokens
     
 
@@ -211,533 +114,604 @@ class CompilationEngine():
     # Handled directly with no method:
     # type, className, subroutineName, variableName, statement, subroutineCall
 
-    # Our parseTree of statements
-    compiledStatements: List[str]
+    # Our parse tree, as lines of XML
+    xml: List[str]
     tokens: List[Token]
+    # the tokens and their values as parallel lists, padded with None past the end
+    lookahead_tokens: List[Union[Token, None]]
+    lookahead_values: List[Union[str, None]]
     current_token_index: int
-    parseTree: ET
+    current_token: Union[Token, None]
+    next_token: Union[Token, None]
+    current_value: Union[str, None]
+    next_value: Union[str, None]
+    # indent of the element being written
+    indent: str
+    debug: bool
+    # token sets the rules check the current token against, built once
+    # ('static' |'field' )
+    class_var_tokens = frozenset([
+        Token(TokenType.KEYWORD, "static"),
+        Token(TokenType.KEYWORD, "field"),
+    ])
+    # ('constructor'|'function' |'method')
+    subroutine_tokens = frozenset([
+        Token(TokenType.KEYWORD, "constructor"),
+        Token(TokenType.KEYWORD, "function"),
+        Token(TokenType.KEYWORD, "method"),
+    ])
+    # type, along with any identifier
+    type_tokens = frozenset([
+        Token(TokenType.KEYWORD, "int"),
+        Token(TokenType.KEYWORD, "char"),
+        Token(TokenType.KEYWORD, "boolean"),
+    ])
+    # ('void' | type)
+    return_type_tokens = type_tokens | frozenset([Token(TokenType.KEYWORD, "void")])
+    # '+', '-', '*', '/', '&', '|', '<', '>', '='
+    op_tokens = frozenset(Token(TokenType.SYMBOL, op) for op in "+-*/&|<>=")
+    # '-' | '~'
+    unary_op_tokens = frozenset(Token(TokenType.SYMBOL, op) for op in "-~")
+    # 'true'|'false'| 'null'|'this'
+    keyword_constant_tokens = frozenset(
+        Token(TokenType.KEYWORD, keyword) for keyword in ["true", "false", "null", "this"])
+    # the tokenizer's shared keyword and symbol tokens, rules check against
+    # these rather than building the expected token on every call
+    keyword_tokens = Tokenizer.keyword_tokens
+    symbol_tokens = Tokenizer.symbol_tokens
+    # minidom escapes quotes in text as well as & < >
+    xml_entities = {'"': "&quot;"}
+    # keywords and symbols share their tokens, so their XML is written once
+    token_xml = {
+        token: f"<{token.type.value}>{escape(token.value)}</{token.type.value}>"
+        for token in [*Tokenizer.keyword_tokens.values(), *Tokenizer.symbol_tokens.values()]
+    }
     
     class ParseException(Exception):
         pass
 
-    def __init__(self, tokens: List[Token]):
+    def __init__(self, tokens: List[Token], debug: bool = False):
         self.tokens = tokens
+        self.debug = debug
+        # two past the end, so the lookahead never needs to check the length
+        self.lookahead_tokens = [*tokens, None, None]
+        self.lookahead_values = [*(token.value for token in tokens), None, None]
         self.current_token_index = 0
-        self.parseTree = None
-
-    @property
-    def current_token(self) -> Token:
-        return self.tokens[self.current_token_index]
-
-    @property
-    def next_token(self) -> Token:
-        return self.tokens[self.current_token_index + 1]
-
-    @property
-    def current_token_value(self) -> str:
-        return self.current_token.value
+        self.set_lookahead(0)
+        self.xml = []
+        self.indent = ""
+
+    # the current and next tokens and their values are kept as plain attributes
+    # so the many reads of them while parsing don't index into the tokens each time,
+    # past the end of the tokens they are None
+    def set_lookahead(self, index: int):
+        tokens = self.lookahead_tokens
+        values = self.lookahead_values
+        self.current_token = tokens[index]
+        self.next_token = tokens[index + 1]
+        self.current_value = values[index]
+        self.next_value = values[index + 1]
 
     def advance(self):
-        self.current_token_index += 1
+        index = self.current_token_index + 1
+        self.current_token_index = index
+        self.set_lookahead(index)
 
     def check_token(self, expected: Token):
-        if self.current_token.type != expected.type:
-            raise self.ParseException(f"Incorrect token type. Expected {expected.type}, got {self.current_token.type}")
-        if expected.value != None and self.current_token.value != expected.value:
-            raise self.ParseException(f"Incorrect token value. Expected {expected.value}, got {self.current_token.value}")
+        token = self.current_token
+        # keywords and symbols are shared tokens, so usually the same object
+        if token is expected:
+            return
+        if token.type != expected.type:
+            raise self.ParseException(f"Incorrect token type. Expected {expected.type}, got {token.type}")
+        if expected.value != None and token.value != expected.value:
+            raise self.ParseException(f"Incorrect token value. Expected {expected.value}, got {token.value}")
         return
 
-    def check_tokens(self, expected_tokens:List[Token]):
-        e = None
-        for token in expected_tokens:
-            try:
-                self.check_token(token)
-            except self.ParseException as e:
-                e = e
-            else:
-                # no error, this works
-                return
-        tokens_pretty = [f"{token.type.value}({token.value}) " for token in expected_tokens]
-        raise self.ParseException(f"Incorrect token. Expected one of {tokens_pretty}, got {self.current_token.type.value}({self.current_token.value})")
+    # check the current token is one of a set built at class level,
+    # optionally any identifier is allowed as well
+    def check_tokens(self, expected_tokens: frozenset, allow_identifier: bool = False):
+        token = self.current_token
+        if token in expected_tokens:
+            return
+        if allow_identifier and token.type == TokenType.IDENTIFIER:
+            return
+        tokens_pretty = sorted(f"{expected.type.value}({expected.value}) " for expected in expected_tokens)
+        if allow_identifier:
+            tokens_pretty.append(f"{TokenType.IDENTIFIER.value}(None) ")
+        raise self.ParseException(f"Incorrect token. Expected one of {tokens_pretty}, got {token.type.value}({token.value})")
 
     # Start the recursive compilation of the parse tree
     def compile(self):
-        if DEBUG:
+        if self.debug:
             print(f"Compiling parse tree with {len(self.tokens)} tokens")
         # Make the assumption a class is at the root
         try:
-            self.compileClass(None)
+            self.compileClass()
         except self.ParseException as e:
             print(e)
     
+    # Utility functions for writing the XML
+    # the lines are indented like minidom's pretty print, elements are
+    # closed on the way out even if a rule fails part way through
+    @contextmanager
+    def xmlElement(self, tag: str):
+        indent = self.indent
+        open_line, close_line, empty_line, inner_indent = self.element_lines(tag, indent)
+        xml = self.xml
+        xml.append(open_line)
+        start = len(xml)
+        self.indent = inner_indent
+        try:
+            yield
+        finally:
+            # restore the outer indent rather than slicing it back off
+            self.indent = indent
+            if len(xml) == start:
+                # nothing inside the element
+                xml[-1] = empty_line
+            else:
+                xml.append(close_line)
+
+    # the lines for an element at a given indent, and the indent inside it,
+    # cached as the same elements appear at the same depths over and over
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def element_lines(tag: str, indent: str) -> Tuple[str, str, str, str]:
+        return f"{indent}<{tag}>", f"{indent}</{tag}>", f"{indent}<{tag}/>", indent + "   "
+
+    # write the current token as a leaf, tagged with its type
+    def writeToken(self):
+        token = self.current_token
+        xml = self.token_xml.get(token)
+        if xml is None:
+            xml = self.token_line(token)
+        self.xml.append(self.indent + xml)
+
+    # the XML for any other token, cached as the same identifiers and
+    # constants repeat throughout a file
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def token_line(token: Token) -> str:
+        tag = token.type.value
+        value = token.value
+        # identifiers and integers can't contain anything to escape
+        if token.type == TokenType.STRING_CONST:
+            value = escape(value, CompilationEngine.xml_entities)
+        return f"<{tag}>{value}</{tag}>" if value else f"<{tag}/>"
+
     # Utility functions for main token types
-    def compileIdentifier(self, element):
+    def compileIdentifier(self):
         self.check_token(Token(TokenType.IDENTIFIER, None))
-        elem = ET.SubElement(element, TokenType.IDENTIFIER.value)
-        elem.text = self.current_token_value
+        self.writeToken()
         self.advance()
 
-    def compileSymbol(self, element, symbol):
-        self.check_token(Token(TokenType.SYMBOL, symbol))
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
+    def compileSymbol(self, symbol):
+        self.check_token(self.symbol_tokens[symbol])
+        self.writeToken()
         self.advance()
 
-    def compileKeyword(self, element, keyword):
-        self.check_token(Token(TokenType.KEYWORD, keyword))
-        elem = ET.SubElement(element, TokenType.KEYWORD.value)
-        elem.text = self.current_token_value
+    def compileKeyword(self, keyword):
+        self.check_token(self.keyword_tokens[keyword])
+        self.writeToken()
         self.advance()
 
-    def compileIntegerConstant(self, element, keyword):
+    def compileIntegerConstant(self, keyword):
         self.check_token(Token(TokenType.INT_CONST, keyword))
-        elem = ET.SubElement(element, TokenType.INT_CONST.value)
-        elem.text = self.current_token_value
+        self.writeToken()
         self.advance()
 
-    def compileStringConstant(self, element, keyword):
+    def compileStringConstant(self, keyword):
         self.check_token(Token(TokenType.STRING_CONST, keyword))
-        elem = ET.SubElement(element, TokenType.STRING_CONST.value)
-        elem.text = self.current_token_value
+        self.writeToken()
         self.advance()
 
 
     # Utility functions for composeability
-    def compileMultiple(self, func: Callable, element: ET.Element):
-        # keep attempting a rule until it fails and we get an exception
-        i = 0
-        isDone = False
-        while (isDone == False):
-            i += 1
-            try:
-                print(f"compileMultiple running {func.__name__}")
-                getattr(self, func.__name__)(element)
-            except self.ParseException:
-                print(f"Stopping running rule after {i} times")
-                isDone = True
-        return
-    
-    def compileOr(self, funcs: List[Callable], element: ET.Element, keyword: str = None):
-        found = False
-        for func in funcs:
-            if found == True:
-                break
-            try:
-                # Figure out if this function has two params, use if needed
-                sig = signature(getattr(self, func.__name__))
-                if len(sig.parameters) == 1:
-                    getattr(self, func.__name__)(element)
-                else:
-                    print("Calling with two params")
-                    getattr(self, func.__name__)(element, keyword)
-            except self.ParseException:
-                print(f"compileOr did not find rule {func.__name__}")
-            else:
-                print(f"compileOr found rule {func.__name__}")
-                found = True
-        if found == False:
-            print(f"compileOr did not find any rules for token {self.current_token}")
-            raise self.ParseException("Could not find func in compileOr")
+    # lookahead checks on the current token, used to decide if a repeated
+    # rule should run again
+    def currentIs(self, token_type: TokenType, value: str) -> bool:
+        token = self.current_token
+        return token.type == token_type and token.value == value
+
+    def currentIn(self, token_type: TokenType, values) -> bool:
+        token = self.current_token
+        return token.type == token_type and token.value in values
 
-    def compileOptional(self, func: Callable, element: ET.Element):
-        try:
-            getattr(self, func.__name__)(element)
-        except self.ParseException:
-            print(f"Optional compile and did not find rule")
 
 
 
     # program structure
     # 'class' className '{' classVarDec* subroutineDec* '}'
-    def compileClass(self, element: ET.Element):
+    def compileClass(self):
         # 'class'
-        self.check_token(Token(TokenType.KEYWORD, "class"))
-        # Class is usually the root node, add a check to see if we need to add the root node here
-        if self.parseTree == None:
-            rootElement = ET.Element("class")
-            self.parseTree = ET.ElementTree(rootElement)
-        if element == None:
-            element = self.parseTree.getroot()
-        elem = ET.SubElement(element, TokenType.KEYWORD.value)
-        elem.text = self.current_token_value
-        self.advance()
-
-        # className
-        self.compileIdentifier(element)
-
-        # '{'
-        self.compileSymbol(element, '{')
-
-        # one or many, classVarDec*
-        self.compileMultiple(self.compileClassVarDec, element)
-        
-        # one or many, subroutineDec*
-        self.compileMultiple(self.compileSubroutineDec, element)
-
-        self.check_token(Token(TokenType.SYMBOL, "}"))
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
-        self.advance()
+        self.check_token(self.keyword_tokens["class"])
+        # Class is the root node
+        with self.xmlElement("class"):
+            self.writeToken()
+            self.advance()
+
+            # className
+            self.compileIdentifier()
+
+            # '{'
+            self.compileSymbol('{')
+
+            # one or many, classVarDec*
+            while self.current_token in self.class_var_tokens:
+                self.compileClassVarDec()
+            
+            # one or many, subroutineDec*
+            while self.current_token in self.subroutine_tokens:
+                self.compileSubroutineDec()
+
+            self.check_token(self.symbol_tokens["}"])
+            self.writeToken()
+            self.advance()
 
     # ('static' |'field' ) type varName (', 'varName)* ';'
     # Compiles a static variable declaration, or a field declaration
-    def compileClassVarDec(self, element: ET.Element):
-        print("compileClassVarDec")
+    def compileClassVarDec(self):
+        if self.debug:
+            print("compileClassVarDec")
         # ('static' |'field' )
-        self.check_tokens([
-            Token(TokenType.KEYWORD, "static"),
-            Token(TokenType.KEYWORD, "field"),
-        ])
-        element = ET.SubElement(element, 'classVarDec')
-        elem = ET.SubElement(element, TokenType.KEYWORD.value)
-        elem.text = self.current_token_value
-        self.advance()
+        self.check_tokens(self.class_var_tokens)
+        with self.xmlElement("classVarDec"):
+            self.writeToken()
+            self.advance()
 
-        # type
-        self.compileType(element)
+            # type
+            self.compileType()
 
-        # varName
-        self.check_token(Token(TokenType.IDENTIFIER, None))
-        elem = ET.SubElement(element, TokenType.IDENTIFIER.value)
-        elem.text = self.current_token_value
-        self.advance()
+            # varName
+            self.check_token(Token(TokenType.IDENTIFIER, None))
+            self.writeToken()
+            self.advance()
 
-        # (', 'varName)*
-        self.compileMultiple(self.compileEndVar, element)
+            # (', 'varName)*
+            while self.currentIs(TokenType.SYMBOL, ","):
+                self.compileEndVar()
 
-        self.check_token(Token(TokenType.SYMBOL, ";"))
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
-        self.advance()
+            self.check_token(self.symbol_tokens[";"])
+            self.writeToken()
+            self.advance()
 
     # (',' varName)
-    def compileEndVar(self, element):
-        self.check_token(Token(TokenType.SYMBOL, ","))
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
+    def compileEndVar(self):
+        self.check_token(self.symbol_tokens[","])
+        self.writeToken()
         self.advance()
 
-        self.compileIdentifier(element)
-
-    def compileType(self, element: ET.Element):
-        type_tokens: List[Token] = [
-            Token(TokenType.KEYWORD, "int"),
-            Token(TokenType.KEYWORD, "char"),
-            Token(TokenType.KEYWORD, "boolean"),
-            Token(TokenType.IDENTIFIER, None),
-        ]
-        self.check_tokens(type_tokens)
-        elem = ET.SubElement(element, self.current_token.type.value)
-        elem.text = self.current_token_value
+        self.compileIdentifier()
+
+    def compileType(self):
+        self.check_tokens(self.type_tokens, allow_identifier=True)
+        self.writeToken()
         self.advance()
 
 
     # ('constructor'|'function' |'method') ('void' | type) subroutineName '(' parameter List ') ' subroutineBody
     # Compiles a complete method, function, or constructor
-    def compileSubroutineDec(self, element: ET.Element):
-        self.check_tokens([
-            Token(TokenType.KEYWORD, "constructor"),
-            Token(TokenType.KEYWORD, "function"),
-            Token(TokenType.KEYWORD, "method"),
-        ])
-        element = ET.SubElement(element, 'subroutineDec')
-        elem = ET.SubElement(element, TokenType.KEYWORD.value)
-        elem.text = self.current_token_value
-        self.advance()
-
-        # ('void' | type)
-        # TODO: make type more composeable
-        self.check_tokens([
-            Token(TokenType.KEYWORD, "void"),
-            Token(TokenType.KEYWORD, "int"),
-            Token(TokenType.KEYWORD, "char"),
-            Token(TokenType.KEYWORD, "boolean"),
-            Token(TokenType.IDENTIFIER, None),
-        ])
-        elem = ET.SubElement(element, self.current_token.type.value)
-        elem.text = self.current_token_value
-        self.advance()
-
-        # subroutineName
-        self.compileIdentifier(element)
+    def compileSubroutineDec(self):
+        self.check_tokens(self.subroutine_tokens)
+        with self.xmlElement("subroutineDec"):
+            self.writeToken()
+            self.advance()
+
+            # ('void' | type)
+            # TODO: make type more composeable
+            self.check_tokens(self.return_type_tokens, allow_identifier=True)
+            self.writeToken()
+            self.advance()
+
+            # subroutineName
+            self.compileIdentifier()
         
-        # '('
-        self.compileSymbol(element, '(')
+            # '('
+            self.compileSymbol('(')
 
-        # parameter List
-        self.compileParameterList(element)
+            # parameter List
+            self.compileParameterList()
 
-        # ')'
-        self.compileSymbol(element, ')')
+            # ')'
+            self.compileSymbol(')')
 
-        # subroutineBody
-        elem = ET.SubElement(element, "subroutineBody")
-        self.compileSubroutineBody(elem)
+            # subroutineBody
+            with self.xmlElement("subroutineBody"):
+                self.compileSubroutineBody()
 
 
     # ( (type varName) (',' type varName)* )?
     # Compiles a (possibly empty) parameter list. Does not handle the enclosing "()".
-    def compileParameterList(self, element: ET.Element):
-        element = ET.SubElement(element, "parameterList")
-        self.compileOptional(self.compileParameterListBase, element)
+    def compileParameterList(self):
+        with self.xmlElement("parameterList"):
+            if not self.currentIs(TokenType.SYMBOL, ")"):
+                self.compileParameterListBase()
     
     # ( (type varName) (',' type varName)* )
-    def compileParameterListBase(self, element: ET.Element):
+    def compileParameterListBase(self):
         # type
-        self.compileType(element)
+        self.compileType()
 
         # varName
-        self.compileIdentifier(element)
+        self.compileIdentifier()
 
         # (' ,' type varName)*
-        self.compileMultiple(self.compileParameter, element)
+        while self.currentIs(TokenType.SYMBOL, ","):
+            self.compileParameter()
     
     # (',' type varName)
-    def compileParameter(self, element: ET.Element):
-        self.compileSymbol(element, ',')
-        self.compileType(element)
-        self.compileIdentifier(element)
+    def compileParameter(self):
+        self.compileSymbol(',')
+        self.compileType()
+        self.compileIdentifier()
 
     # '{' varDec* statements '}'
-    def compileSubroutineBody(self, element: ET.Element):
-        self.compileSymbol(element, '{')
-        self.compileMultiple(self.compileVarDec, element)
-        self.compileStatements(element)
-        self.compileSymbol(element, '}')
+    def compileSubroutineBody(self):
+        self.compileSymbol('{')
+        while self.currentIs(TokenType.KEYWORD, "var"):
+            self.compileVarDec()
+        self.compileStatements()
+        self.compileSymbol('}')
     
     # 'var' type varName (',' varName)* ';'
-    def compileVarDec(self, element: ET.Element):
-        self.check_token(Token(TokenType.KEYWORD, 'var'))
-        element = ET.SubElement(element, "varDec")
-        self.compileKeyword(element, 'var')
-        self.compileType(element)
-        self.compileIdentifier(element)
-        self.compileMultiple(self.compileEndVar, element)
-        self.compileSymbol(element, ';')
+    def compileVarDec(self):
+        self.check_token(self.keyword_tokens['var'])
+        with self.xmlElement("varDec"):
+            self.compileKeyword('var')
+            self.compileType()
+            self.compileIdentifier()
+            while self.currentIs(TokenType.SYMBOL, ","):
+                self.compileEndVar()
+            self.compileSymbol(';')
 
-    def compileClassName(self, element: ET.Element):
-        self.compileIdentifier(element)
+    def compileClassName(self):
+        self.compileIdentifier()
 
-    def compileSubroutineName(self, element: ET.Element):
-        self.compileIdentifier(element)
+    def compileSubroutineName(self):
+        self.compileIdentifier()
 
-    def compileVarName(self, element: ET.Element):
-        self.compileIdentifier(element)
+    def compileVarName(self):
+        self.compileIdentifier()
 
     # varName '[' expression ']'
-    def compileVarNameWithBoxedExpression(self, element: ET.Element):
-        print("compileVarNameWithBoxedExpression")
-        self.compileIdentifier(element)
-        self.compileSymbol(element, '[')
-        self.compileExpression(element)
-        self.compileSymbol(element, ']')
+    def compileVarNameWithBoxedExpression(self):
+        if self.debug:
+            print("compileVarNameWithBoxedExpression")
+        self.compileIdentifier()
+        self.compileSymbol('[')
+        self.compileExpression()
+        self.compileSymbol(']')
 
     # statements
 
     # statement*
-    def compileStatements(self, element: ET.Element):
-        element = ET.SubElement(element, "statements")
-        self.compileMultiple(self.compileStatement, element)
+    def compileStatements(self):
+        with self.xmlElement("statements"):
+            while self.currentIn(TokenType.KEYWORD, self.statement_rules):
+                self.compileStatement()
 
     # letStatement | ifStatement | whileStatement | doStatement | returnStatement
-    def compileStatement(self, element: ET.Element):
-        statements = [self.compileLet, self.compileIf, self.compileWhile, self.compileDo, self.compileReturn]
-        self.compileOr(statements, element)
+    def compileStatement(self):
+        # the keyword starting a statement picks its rule
+        token = self.current_token
+        rule = None
+        if token.type == TokenType.KEYWORD:
+            rule = self.statement_rules.get(token.value)
+        if rule is None:
+            raise self.ParseException(f"Incorrect token. Expected a statement, got {token.type.value}({token.value})")
+        rule(self)
 
     # 'let' varName ('[' expression ']')? '=' expression ';'
-    def compileLet(self, element: ET.Element):
-        print(f"start of let")
-        self.check_token(Token(TokenType.KEYWORD, 'let'))
-        element = ET.SubElement(element, "letStatement")
-        self.compileKeyword(element, 'let')
-        self.compileVarName(element)
-        print("optional boxed expression...")
-        self.compileOptional(self.compileBoxedExpression, element)
-        self.compileSymbol(element, '=')
-        print(f"compileLet after = expression current token {self.current_token}")
-        self.compileExpression(element)
-        self.compileSymbol(element, ';')
-        print("got to end of let")
-
-    def compileBoxedExpression(self, element: ET.Element):
-        print(f"compileBoxedExpression start token {self.current_token}")
-        self.compileSymbol(element, '[')
-        print(f"compileBoxedExpression after [ {self.current_token}")
-        self.compileExpression(element)
-        print(f"compileBoxedExpression after expression {self.current_token}")
-        self.compileSymbol(element, ']')
-        print(f"compileBoxedExpression after ] {self.current_token}")
+    def compileLet(self):
+        if self.debug:
+            print(f"start of let")
+        self.check_token(self.keyword_tokens['let'])
+        with self.xmlElement("letStatement"):
+            self.compileKeyword('let')
+            self.compileVarName()
+            if self.debug:
+                print("optional boxed expression...")
+            if self.currentIs(TokenType.SYMBOL, "["):
+                self.compileBoxedExpression()
+            self.compileSymbol('=')
+            if self.debug:
+                print(f"compileLet after = expression current token {self.current_token}")
+            self.compileExpression()
+            self.compileSymbol(';')
+            if self.debug:
+                print("got to end of let")
+
+    def compileBoxedExpression(self):
+        if self.debug:
+            print(f"compileBoxedExpression start token {self.current_token}")
+        self.compileSymbol('[')
+        if self.debug:
+            print(f"compileBoxedExpression after [ {self.current_token}")
+        self.compileExpression()
+        if self.debug:
+            print(f"compileBoxedExpression after expression {self.current_token}")
+        self.compileSymbol(']')
+        if self.debug:
+            print(f"compileBoxedExpression after ] {self.current_token}")
 
     # '(' expression ')'
-    def compileBracketedExpression(self, element: ET.Element):
-        self.compileSymbol(element, '(')
-        self.compileExpression(element)
-        self.compileSymbol(element, ')')
+    def compileBracketedExpression(self):
+        self.compileSymbol('(')
+        self.compileExpression()
+        self.compileSymbol(')')
 
     # 'if' '(' expression ')' '{' statements '}' ( 'else' '{' statements '}' )?
-    def compileIf(self, element: ET.Element):
-        self.check_token(Token(TokenType.KEYWORD, 'if'))
-        element = ET.SubElement(element, "ifStatement")
-        self.compileKeyword(element, 'if')
-        self.compileBracketedExpression(element)
-        self.compileSymbol(element, '{')
-        self.compileStatements(element)
-        self.compileSymbol(element, '}')
-        self.compileOptional(self.compileElse, element)
-
-    def compileElse(self, element: ET.Element):
-        self.compileKeyword(element, 'else')
-        self.compileSymbol(element, '{')
-        self.compileStatements(element)
-        self.compileSymbol(element, '}')
+    def compileIf(self):
+        self.check_token(self.keyword_tokens['if'])
+        with self.xmlElement("ifStatement"):
+            self.compileKeyword('if')
+            self.compileBracketedExpression()
+            self.compileSymbol('{')
+            self.compileStatements()
+            self.compileSymbol('}')
+            if self.currentIs(TokenType.KEYWORD, "else"):
+                self.compileElse()
+
+    def compileElse(self):
+        self.compileKeyword('else')
+        self.compileSymbol('{')
+        self.compileStatements()
+        self.compileSymbol('}')
 
     # 'while' '(' expression ')' '{' statements '}'
-    def compileWhile(self, element: ET.Element):
-        self.check_token(Token(TokenType.KEYWORD, 'while'))
-        element = ET.SubElement(element, "whileStatement")
-        self.compileKeyword(element, 'while')
-        self.compileBracketedExpression(element)
-        self.compileSymbol(element, '{')
-        self.compileStatements(element)
-        self.compileSymbol(element, '}')
+    def compileWhile(self):
+        self.check_token(self.keyword_tokens['while'])
+        with self.xmlElement("whileStatement"):
+            self.compileKeyword('while')
+            self.compileBracketedExpression()
+            self.compileSymbol('{')
+            self.compileStatements()
+            self.compileSymbol('}')
     
     # 'do' subroutineCall ';'
-    def compileDo(self, element: ET.Element):
-        self.check_token(Token(TokenType.KEYWORD, 'do'))
-        element = ET.SubElement(element, "doStatement")
-        self.compileKeyword(element, 'do')
-        self.compileSubroutineCall(element)
-        self.compileSymbol(element, ';')
+    def compileDo(self):
+        self.check_token(self.keyword_tokens['do'])
+        with self.xmlElement("doStatement"):
+            self.compileKeyword('do')
+            self.compileSubroutineCall()
+            self.compileSymbol(';')
     
     # 'return' expression? ';'
-    def compileReturn(self, element: ET.Element):
-        self.check_token(Token(TokenType.KEYWORD, 'return'))
-        element = ET.SubElement(element, "returnStatement")
-        self.compileKeyword(element, 'return')
-        self.compileOptional(self.compileExpression, element)
-        self.compileSymbol(element, ';')
+    def compileReturn(self):
+        self.check_token(self.keyword_tokens['return'])
+        with self.xmlElement("returnStatement"):
+            self.compileKeyword('return')
+            if not self.currentIs(TokenType.SYMBOL, ";"):
+                self.compileExpression()
+            self.compileSymbol(';')
+
+    # statement rules by their starting keyword, built once with the class
+    # rather than as bound methods for every file's engine
+    statement_rules = {
+        "let": compileLet,
+        "if": compileIf,
+        "while": compileWhile,
+        "do": compileDo,
+        "return": compileReturn,
+    }
     
     # expressions
 
     # term (op term)?
-    def compileExpression(self, element: ET.Element):
-        print("compileExpression")
-        print(f"token {self.current_token}")
-        element = ET.SubElement(element, "expression")
-        self.compileTerm(element)
-        self.compileOptional(self.compileOpTerm, element)
+    def compileExpression(self):
+        if self.debug:
+            print("compileExpression")
+            print(f"token {self.current_token}")
+        with self.xmlElement("expression"):
+            self.compileTerm()
+            if self.current_token in self.op_tokens:
+                self.compileOpTerm()
 
     # integerConstant| stringConstant| keywordConstant | varName | 
     # varName '[' expression ']' | subroutineCall | '(' expression ')' | unaryOp term    
-    def compileTerm(self, element: ET.Element):
-        element = ET.SubElement(element, "term")
-        print(f"compileTerm at token {self.current_token}, next_token {self.next_token}")
-        
-        # Need to look ahead a bit here to check for boxed expressions
-        if self.next_token.value == "[":
-            print(f"compileTerm next token is {self.next_token}, calling compileVarNameWithBoxedExpression")
-            self.compileVarNameWithBoxedExpression(element)
-            return
+    def compileTerm(self):
+        with self.xmlElement("term"):
+            if self.debug:
+                print(f"compileTerm at token {self.current_token}, next_token {self.next_token}")
         
-        statements = [
-            self.compileSubroutineCall, self.compileIntegerConstant, self.compileStringConstant, 
-            self.compileKeywordConstant, self.compileVarName,
-            self.compileBracketedExpression, self.unaryOpTerm
-        ]
-        self.compileOr(statements, element)
-
-    def unaryOpTerm(self, element: ET.Element):
-        self.compileUnaryOp(element)
-        self.compileTerm(element)
+            # Need to look ahead a bit here to check for boxed expressions
+            if self.next_value == "[":
+                if self.debug:
+                    print(f"compileTerm next token is {self.next_token}, calling compileVarNameWithBoxedExpression")
+                self.compileVarNameWithBoxedExpression()
+                return
+
+            # otherwise the token type picks the rule, identifiers look ahead
+            # for a subroutine call
+            # the type is read once, enum members are singletons so compare by identity
+            token_type = self.current_token.type
+            if token_type is TokenType.INT_CONST:
+                self.compileIntegerConstant(None)
+            elif token_type is TokenType.STRING_CONST:
+                self.compileStringConstant(None)
+            elif token_type is TokenType.KEYWORD:
+                self.compileKeywordConstant()
+            elif token_type is TokenType.IDENTIFIER:
+                if self.next_value in ("(", "."):
+                    self.compileSubroutineCall()
+                else:
+                    self.compileVarName()
+            elif self.current_value == "(":
+                self.compileBracketedExpression()
+            else:
+                self.unaryOpTerm()
+
+    def unaryOpTerm(self):
+        self.compileUnaryOp()
+        self.compileTerm()
     
     # (op term)
-    def compileOpTerm(self, element: ET.Element):
-        print(f"compileOpTerm at token {self.current_token}")
-        self.compileOp(element)
-        self.compileTerm(element)
+    def compileOpTerm(self):
+        if self.debug:
+            print(f"compileOpTerm at token {self.current_token}")
+        self.compileOp()
+        self.compileTerm()
     
     # subroutineName '(' expressionList ')' | ( class Name | var Name) '.' subroutineName '('expressionList ')'
-    def compileSubroutineCall(self, element: ET.Element):
-        print("compileSubroutineCall")
-        statements = [self.compileExpressionListSubroutineCall, self.compileExpressionListCall]
-        self.compileOr(statements, element)
+    def compileSubroutineCall(self):
+        if self.debug:
+            print("compileSubroutineCall")
+        # we need to look ahead here to see if we're calling a method of an object
+        if self.next_value == ".":
+            self.compileExpressionListSubroutineCall()
+        else:
+            self.compileExpressionListCall()
 
     # ( class Name | var Name) '.' subroutineName '('expressionList")'
-    def compileExpressionListSubroutineCall(self, element: ET.Element):
-        # we need to look ahead here to see if we're calling a method of an object
-        print(f"looking ahead at next token {self.next_token}")
-        if self.next_token.type != TokenType.SYMBOL or self.next_token.value != ".":
-            print(f"object.subroutine() was not detected, next token {self.next_token}")
-            raise self.ParseException(f"object.subroutine() was not detected, next token {self.next_token}")
-        print("object.subroutine() was detected")
-        statements = [self.compileClassName, self.compileVarName]
-        self.compileOr(statements, element)
-        self.compileSymbol(element, '.')
-        self.compileSubroutineName(element)
-        self.compileSymbol(element, '(')
-        self.compileExpressionList(element)
-        self.compileSymbol(element, ')')
-
-    # '(' expressionList ')'
-    def compileExpressionListCall(self, element: ET.Element):
-        self.check_token(Token(TokenType.SYMBOL, "("))
-        self.compileSubroutineName(element)
-        self.compileSymbol(element, '(')
-        self.compileExpressionList(element)
-        self.compileSymbol(element, ')')
+    def compileExpressionListSubroutineCall(self):
+        # className and varName are both just an identifier
+        self.compileClassName()
+        self.compileSymbol('.')
+        self.compileSubroutineName()
+        self.compileSymbol('(')
+        self.compileExpressionList()
+        self.compileSymbol(')')
+
+    # subroutineName '(' expressionList ')'
+    def compileExpressionListCall(self):
+        self.compileSubroutineName()
+        self.compileSymbol('(')
+        self.compileExpressionList()
+        self.compileSymbol(')')
 
     # (expression (',' expression)* )?
-    def compileExpressionList(self, element: ET.Element):
-        self.compileOptional(self.compileExpressionListBase, element)
+    def compileExpressionList(self):
+        if not self.currentIs(TokenType.SYMBOL, ")"):
+            self.compileExpressionListBase()
     
     # (expression (',' expression)* )
-    def compileExpressionListBase(self, element: ET.Element):
-        self.compileExpression(element)
-        self.compileMultiple(self.compileExpressionMultiple, element)
+    def compileExpressionListBase(self):
+        self.compileExpression()
+        while self.currentIs(TokenType.SYMBOL, ","):
+            self.compileExpressionMultiple()
 
     # (',' expression)
-    def compileExpressionMultiple(self, element: ET.Element):
-        self.compileSymbol(element, ',')
-        self.compileExpression(element)
+    def compileExpressionMultiple(self):
+        self.compileSymbol(',')
+        self.compileExpression()
 
     # '+', '-', '*', '/', '&', '|', '<', '>', '='
-    def compileOp(self, element: ET.Element):
-        self.check_tokens([
-            Token(TokenType.SYMBOL, "+"),
-            Token(TokenType.SYMBOL, "-"),
-            Token(TokenType.SYMBOL, "*"),
-            Token(TokenType.SYMBOL, "/"),
-            Token(TokenType.SYMBOL, "&"),
-            Token(TokenType.SYMBOL, "|"),
-            Token(TokenType.SYMBOL, "<"),
-            Token(TokenType.SYMBOL, ">"),
-            Token(TokenType.SYMBOL, "=")
-        ])
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
+    def compileOp(self):
+        self.check_tokens(self.op_tokens)
+        self.writeToken()
         self.advance()
     
     # '-' | '~'
-    def compileUnaryOp(self, element: ET.Element):
-        self.check_tokens([
-            Token(TokenType.SYMBOL, "-"),
-            Token(TokenType.SYMBOL, "~"),
-        ])
-        elem = ET.SubElement(element, TokenType.SYMBOL.value)
-        elem.text = self.current_token_value
+    def compileUnaryOp(self):
+        self.check_tokens(self.unary_op_tokens)
+        self.writeToken()
         self.advance()
     
     # 'true'|'false'| 'null'|'this'
-    def compileKeywordConstant(self, element: ET.Element):
-        self.check_tokens([
-            Token(TokenType.KEYWORD, 'true'),
-            Token(TokenType.KEYWORD, 'false'),
-            Token(TokenType.KEYWORD, 'null'),
-            Token(TokenType.KEYWORD, 'this')
-        ])
-        self.check_token(Token(TokenType.KEYWORD, None))
-        elem = ET.SubElement(element, TokenType.KEYWORD.value)
-        elem.text = self.current_token_value
+    def compileKeywordConstant(self):
+        self.check_tokens(self.keyword_constant_tokens)
+        self.writeToken()
         self.advance()    
 
 """
@@ -752,132 +726,129 @@ class JackAnalyser():
     # tokens: List[Token] = []
     # parsed_output = []
 
-    @dataclass
+    @dataclass(slots=True)
     class JackFile:
         name: str
         path: str
-        # each line is a single long string
-        data: List[str]
+        # the whole source, with comments removed
+        data: str
+
+    # "string constant", // comment to end of line, or /* comment */
+    comment_pattern = re.compile(r'("[^"\n]*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
 
     # File or directory
     input_path: str
     output_path: str
     files: List[JackFile]
+    debug: bool
     
-    def __init__(self, input_path, output_path):
+    def __init__(self, input_path, output_path, debug: bool = False):
         self.input_path = input_path
         self.output_path = output_path
+        self.debug = debug
         self.files = []
 
         # find all files, read data from them, clean data
-        # for file_path in dir:
-        #     jackFile = self.read_file(file_path)
-        #     self.files.append(jackFile)
-        jackFile = self.read_file(input_path)
-        self.files.append(jackFile)
+        if isdir(input_path):
+            with scandir(input_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".jack"):
+                        self.files.append(self.read_file(entry.path))
+        else:
+            self.files.append(self.read_file(input_path))
 
 
     def read_file(self, file_path) -> List[JackFile]:
         path = pathlib.PurePath(file_path)
-        if DEBUG:
+        if self.debug:
             print(f"Reading raw file {path.name} at {file_path}")
 
         fileReader = open(file_path, "r")
-        lines = fileReader.readlines()
+        # strip the comments from the whole file in one pass
+        src = self.comment_pattern.sub(self.strip_comment, fileReader.read())
         fileReader.close()
 
-        lines = self.clean_lines(lines)
-        return self.JackFile(path.name, file_path, lines)
-
-    def clean_lines(self, lines: List[str]) -> List[str]:
-        # just read the whole file, trim out whitespace, empty lines
-        clean_lines = []
-        for line in lines:
-            clean_line = self.trim_line(line)
-            if clean_line == "\n":
-                continue
-            if clean_line == "":
-                continue
-            if clean_line[0:2] == "/*" and clean_line[-2:len(clean_line)] == "*/":
-                continue
-            clean_lines.append(clean_line)
-        return clean_lines
-
-    def trim_line(self, line: str):
-        # if DEBUG:
-        #     print(f"trimming line:'{line}' ")
-        # remove comments and whitespace
-        lstripped = line.lstrip()
-        # remove lines that start with comment
-        if lstripped[0:2] == "//":
-            # if DEBUG:
-            #     print("trimmed to '\n'")
-            return "\n"
-        # remove comments at end of line
-        if "//" in lstripped:
-            lstripped = lstripped.split('//')[0]
-
-        # strip newlines
-        line_trimmed = lstripped.rstrip()
-        # if DEBUG:
-        #     print(f"trimmed to:'{line_trimmed}'")
-        return line_trimmed
+        return self.JackFile(path.name, file_path, src)
+
+    # string constants are matched too so comment markers inside them stay,
+    # comments become a space so the tokens either side stay apart
+    def strip_comment(self, match: re.Match) -> str:
+        return match.group(1) or " "
 
     def analyse(self):
-        for file in self.files:
-            if DEBUG:
-                print(f"Analysing file {file.name} at {file.path}")
-            tokenizer = Tokenizer(file.data)
-            tokens = tokenizer.tokenize()
-            # print tokens to compare with xxxT.xml file
-            # self.write_token_XML(tokens)
-
-            # if DEBUG:
-            #     [ print(f"{token.type}, value:{token.value}") for token in tokens ]
-            compilationEngine = CompilationEngine(tokens)
-            compilationEngine.compile()
-            self.write_XML(compilationEngine.parseTree, self.output_path)
-
-    # Walk the parse tree and write to XML
-    def write_XML(self, parseTree:ET, file_location: str):
-        if DEBUG:
+        # the files are independent, so several are compiled in parallel processes,
+        # the results come back in order so they're written in order
+        compile = partial(compile_file, debug=self.debug)
+        if len(self.files) > 1:
+            with ProcessPoolExecutor() as executor:
+                for file, xml in zip(self.files, executor.map(compile, self.files)):
+                    self.write_XML(xml, self.output_location(file))
+        else:
+            for file in self.files:
+                self.write_XML(compile(file), self.output_location(file))
+
+    # a folder of files is written as fileName.xml for each file in the output folder
+    def output_location(self, file: JackFile) -> Union[str, None]:
+        if self.output_path is None or not isdir(self.input_path):
+            return self.output_path
+        return str(pathlib.PurePath(self.output_path, pathlib.PurePath(file.name).stem + ".xml"))
+
+    # Write the compiled XML lines
+    def write_XML(self, xml: List[str], file_location: str):
+        if self.debug:
             print(f"writing to location {file_location}")
-        # ET.dump(parseTree)
-        xmlstr = minidom.parseString(ET.tostring(parseTree.getroot())).toprettyxml(indent="   ")
-        print(xmlstr)
-        return
-
-    def write_token_XML(self, tokens: List[Token]):
-        rootElement = ET.Element("tokens")
-        parseTree = ET.ElementTree(rootElement)
-        element = parseTree.getroot()
-        for token in tokens:
-            elem = ET.SubElement(element, token.type.value)
-            elem.text = token.value
-
-        xmlstr = minidom.parseString(ET.tostring(element)).toprettyxml(indent="")
-        print(xmlstr)
-
+        # no output file given, write to stdout instead
+        if file_location is None:
+            self.write_lines(xml, sys.stdout)
+            return
+        with open(file_location, "w") as fileWriter:
+            self.write_lines(xml, fileWriter)
+
+    # stream the lines out rather than joining the whole document first,
+    # print does the per line writes in C rather than in a Python loop
+    def write_lines(self, xml: List[str], writer: TextIO):
+        print('<?xml version="1.0" ?>', *xml, sep="\n", file=writer)
+
+    # the tokens go through the same writer as the parse tree
+    def write_token_XML(self, tokens: List[Token], file_location: str):
+        # the same lines the parse tree uses, so each distinct token is only escaped once
+        token_xml = CompilationEngine.token_xml
+        token_line = CompilationEngine.token_line
+        # build all the lines in one comprehension rather than appending per token
+        xml = [token_xml.get(token) or token_line(token) for token in tokens]
+        self.write_XML(["<tokens>", *xml, "</tokens>"], file_location)
+
+
+# tokenize and compile one file, at module level so a process pool can run it
+def compile_file(file: JackAnalyser.JackFile, debug: bool = False) -> List[str]:
+    if debug:
+        print(f"Analysing file {file.name} at {file.path}")
+    tokenizer = Tokenizer(file.data, debug)
+    tokens = tokenizer.tokenize()
+    # print tokens to compare with xxxT.xml file
+    # JackAnalyser.write_token_XML(tokens, output_path)
+
+    # if debug:
+    #     [ print(f"{token.type}, value:{token.value}") for token in tokens ]
+    compilationEngine = CompilationEngine(tokens, debug)
+    compilationEngine.compile()
+    return compilationEngine.xml
 
 def main():
-    global DEBUG
     argparser = argparse.ArgumentParser(description='SyntaxAnalyser')
     argparser.add_argument('--fileread')
     argparser.add_argument('--filewrite')
-    argparser.add_argument('--debug', action=argparse.BooleanOptionalAction)
+    # debug output is opt in, like the assembler
+    argparser.add_argument('--debug', action=argparse.BooleanOptionalAction, default=False)
 
     args = argparser.parse_args()
-    if args.debug is not None:
-        DEBUG = args.debug
-    if DEBUG:
+    if args.debug:
         print("Running SyntaxAnalyser")
         print(f"reading from {args.fileread}")
         print(f"writing to {args.filewrite}")
 
-    analyser = JackAnalyser(args.fileread, args.filewrite)
+    analyser = JackAnalyser(args.fileread, args.filewrite, args.debug)
     analyser.analyse()
 
-DEBUG = True
-
 if __name__ == "__main__":
     main()
\ No newline at end of file